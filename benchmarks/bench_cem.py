@@ -0,0 +1,206 @@
+"""Micro-benchmarks of the CEM core, across numbers of classes and samples.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_cem --output bench.json
+    python -m benchmarks.bench_cem --baseline bench.json --threshold 0.2
+
+The second command exits with status 1 if any case got slower than its
+baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.CEM import (
+    PROXIMITY_MATRIX_CACHE,
+    ClosenessEvaluationMeasureCompute,
+    ClosenessInformationQuantityCompute,
+)
+from src.ordinal_class_dist import OrdinalClassDistribution
+
+DEFAULT_NUMB_CLASSES = [3, 10, 100, 1000, 5000]
+DEFAULT_NUMB_SAMPLES = [10**2, 10**4, 10**6, 10**8]
+NUMB_SAMPLED_PAIRS = 1000
+
+
+def generate_confusion_counts(
+    numb_classes: int, numb_samples: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Draw a confusion matrix whose predictions mostly hit or neighbour the
+    actual class, as ordinal classifiers do."""
+    class_weights = rng.dirichlet(np.ones(numb_classes))
+    distances = np.abs(np.subtract.outer(np.arange(numb_classes), np.arange(numb_classes)))
+    cell_weights = class_weights[:, np.newaxis] * np.exp(-distances)
+    cell_weights /= cell_weights.sum()
+    return rng.multinomial(numb_samples, cell_weights.ravel()).reshape(
+        numb_classes, numb_classes
+    )
+
+
+def time_func(func: Callable[[], None], repeat: int, setup: Callable[[], None]) -> List[float]:
+    timings = list()
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_cases(
+    numb_classes: int, numb_samples: int, repeat: int, seed: int
+) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    confusion_counts = generate_confusion_counts(numb_classes, numb_samples, rng)
+    class_names = [f"class_{index}" for index in range(numb_classes)]
+    orders = list(range(1, numb_classes + 1))
+    actual_counts = confusion_counts.sum(axis=1).tolist()
+    confusion_matrix = pd.DataFrame(confusion_counts, index=class_names, columns=class_names)
+
+    ordinal_dist = OrdinalClassDistribution(class_names, orders, actual_counts)
+    CIQ_compute = ClosenessInformationQuantityCompute(ordinal_dist)
+    CEM_compute = ClosenessEvaluationMeasureCompute(confusion_matrix, class_names, orders)
+    # proximity needs samples in the first class of each pair
+    observed_class_names = [
+        class_name for class_name, count in zip(class_names, actual_counts) if count > 0
+    ]
+    sampled_pairs = [
+        (
+            observed_class_names[rng.integers(len(observed_class_names))],
+            class_names[rng.integers(numb_classes)],
+        )
+        for _ in range(NUMB_SAMPLED_PAIRS)
+    ]
+
+    def get_sampled_proximities() -> None:
+        for first_class, second_class in sampled_pairs:
+            CIQ_compute.get_proximity_between_two_classes(first_class, second_class)
+
+    cases = {
+        "OrdinalClassDistribution": lambda: OrdinalClassDistribution(
+            class_names, orders, actual_counts
+        ),
+        f"get_proximity_between_two_classes x{NUMB_SAMPLED_PAIRS}": get_sampled_proximities,
+        "ClosenessInformationQuantityCompute.get_proximity_matrix": CIQ_compute.get_proximity_matrix,
+        "ClosenessEvaluationMeasureCompute.get_proximity_matrix": CEM_compute.get_proximity_matrix,
+        "get_proximity_between_two_dists": CEM_compute.get_proximity_between_two_dists,
+    }
+
+    results = list()
+    for name, func in cases.items():
+        # measure cold computation, not cache hits
+        timings = time_func(func, repeat, setup=PROXIMITY_MATRIX_CACHE.clear)
+        results.append(
+            {
+                "name": name,
+                "numb_classes": numb_classes,
+                "numb_samples": numb_samples,
+                "repeat": repeat,
+                "min_seconds": min(timings),
+                "median_seconds": statistics.median(timings),
+            }
+        )
+    return results
+
+
+def get_case_key(result: Dict) -> tuple:
+    return result["name"], result["numb_classes"], result["numb_samples"]
+
+
+def compare_with_baseline(
+    results: List[Dict], baseline_results: List[Dict], threshold: float
+) -> List[Dict]:
+    """Pair results with their baseline, flagging those slower by more than
+    threshold (relative, on the minimum timing)."""
+    baseline_mapping = {get_case_key(result): result for result in baseline_results}
+    comparisons = list()
+    for result in results:
+        baseline_result = baseline_mapping.get(get_case_key(result))
+        if baseline_result is None:
+            continue
+        ratio = result["min_seconds"] / baseline_result["min_seconds"]
+        comparisons.append(
+            {
+                "name": result["name"],
+                "numb_classes": result["numb_classes"],
+                "numb_samples": result["numb_samples"],
+                "baseline_seconds": baseline_result["min_seconds"],
+                "current_seconds": result["min_seconds"],
+                "ratio": ratio,
+                "is_regression": ratio > 1 + threshold,
+            }
+        )
+    return comparisons
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--classes", type=int, nargs="+", default=DEFAULT_NUMB_CLASSES)
+    parser.add_argument("--samples", type=int, nargs="+", default=DEFAULT_NUMB_SAMPLES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="path of the JSON results, default to stdout")
+    parser.add_argument("--baseline", help="path of JSON results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown over the baseline flagged as a regression",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = list()
+    for numb_classes in args.classes:
+        for numb_samples in args.samples:
+            print(f"K={numb_classes} N={numb_samples}", file=sys.stderr)
+            results.extend(run_cases(numb_classes, numb_samples, args.repeat, args.seed))
+
+    report = {
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline_results = json.load(baseline_file)["results"]
+        comparisons = compare_with_baseline(results, baseline_results, args.threshold)
+        report["comparisons"] = comparisons
+        regressions = [comparison for comparison in comparisons if comparison["is_regression"]]
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['name']} K={regression['numb_classes']} "
+                f"N={regression['numb_samples']}: {regression['ratio']:.2f}x",
+                file=sys.stderr,
+            )
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
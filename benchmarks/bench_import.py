@@ -0,0 +1,114 @@
+"""Cold-start import time of the CEM modules, each in a fresh interpreter.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_import --output import.json
+    python -m benchmarks.bench_import --modules src.CEM --repeat 20
+
+Each result also lists the heavy optional dependencies which the import
+pulled in, expected to be empty for the core modules.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+DEFAULT_MODULES = [
+    "numpy",
+    "src.CEM",
+    "src.streaming",
+    "src.resampling",
+    "src.io_utils",
+    "src.batch_evaluate",
+    "src.viz_utils",
+]
+HEAVY_MODULES = ["pandas", "matplotlib", "streamlit", "pyarrow", "scipy"]
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in the child interpreter, timing the import alone, without startup
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy_modules = [name for name in {heavy_modules!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy_modules": heavy_modules}}))
+"""
+
+
+def time_import(module: str) -> Dict:
+    """Import module in a fresh interpreter.
+
+    Args:
+        module (str): dotted module name
+
+    Returns:
+        Dict: import seconds and heavy modules loaded along
+    """
+    script = IMPORT_SCRIPT.format(module=module, heavy_modules=HEAVY_MODULES)
+    completed_process = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=REPOSITORY_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed_process.stdout)
+
+
+def run_case(module: str, repeat: int) -> Dict:
+    measurements = [time_import(module) for _ in range(repeat)]
+    timings = [measurement["seconds"] for measurement in measurements]
+    return {
+        "name": module,
+        "repeat": repeat,
+        "min_seconds": min(timings),
+        "median_seconds": statistics.median(timings),
+        "heavy_modules": measurements[0]["heavy_modules"],
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="path of the JSON results, default to stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = list()
+    for module in args.modules:
+        result = run_case(module, args.repeat)
+        print(
+            f"{module}: {result['min_seconds'] * 1000:.1f} ms "
+            f"{' '.join(result['heavy_modules'])}",
+            file=sys.stderr,
+        )
+        results.append(result)
+
+    report = {
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,68 @@
+import os
+from typing import List
+
 import streamlit as st
 import numpy as np
 
 np.random.seed(42)
 import pandas as pd
 
-from src.CEM import ClosenessEvaluationMeasureCompute
-from src.utils import compute_accuracy_score
+from src.CEM import ClosenessEvaluationMeasureCompute, compute_cem_batch
+from src.utils import compute_accuracy_score, get_top_n_class_pairs
 
 from src.viz_utils import (
-    get_class_proximity_dict_from_confusion_matrix,
-    get_top_n_from_dict,
+    get_proximity_matrix_from_class_distribution,
     scatter_plot_from_confusion_matrix,
     scatter_plot_from_single_class_distribution,
 )
 
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def read_csv_cached(csv_path: str, file_signature: tuple) -> pd.DataFrame:
+    # file_signature is part of the cache key only, so an edited file is reloaded
+    return pd.read_csv(csv_path, header=0)
+
+
+def load_csv(csv_path: str) -> pd.DataFrame:
+    file_stat = os.stat(csv_path)
+    return read_csv_cached(csv_path, (file_stat.st_mtime_ns, file_stat.st_size))
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def compute_CEM_score(
+    confusion_matrix_df: pd.DataFrame, class_names: List[str], orders: List[int]
+) -> float:
+    CEM_compute = ClosenessEvaluationMeasureCompute(
+        confusion_matrix=confusion_matrix_df.set_index("actual\\predict"),
+        class_names=class_names,
+        orders=orders,
+    )
+    return CEM_compute.get_proximity_between_two_dists()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def compute_CEM_scores(
+    confusion_matrix_dfs: List[pd.DataFrame], class_names: List[str], orders: List[int]
+) -> np.ndarray:
+    # the confusion matrices must share the same groundtruth
+    return compute_cem_batch(
+        np.stack(
+            [
+                confusion_matrix_df.set_index("actual\\predict")
+                .loc[class_names, class_names]
+                .values
+                for confusion_matrix_df in confusion_matrix_dfs
+            ]
+        ),
+        orders=orders,
+    )
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def compute_class_proximity_matrix(class_dist_df: pd.DataFrame) -> np.ndarray:
+    return get_proximity_matrix_from_class_distribution(class_dist_df)
+
+
 st.set_page_config(
     page_title="Closeness Evaluation Measure",
     page_icon="📊",
@@ -87,16 +136,16 @@ with st.container(border=True):
         )
 
     with col2:
-        st.latex("C=\{c_1, ..., c_m\}")
-        st.latex("\{n_1, ..., n_m\}, \\ N=\Sigma_{i=1}^{m} n_i")
+        st.latex("C=\\{c_1, ..., c_m\\}")
+        st.latex("\\{n_1, ..., n_m\\}, \\ N=\\Sigma_{i=1}^{m} n_i")
         st.markdown("")
         st.latex("IC(c_i, c_j)")
         st.latex("-log(.)")
         st.markdown("")
-        st.latex("\\frac{\\frac{n_i}{2} + \Sigma_{k=i+1}^{j} n_k}{N}")
+        st.latex("\\frac{\\frac{n_i}{2} + \\Sigma_{k=i+1}^{j} n_k}{N}")
 
 st.markdown("Put it all together, we have")
-st.latex("IC(c_i, c_j) = -log(\\frac{\\frac{n_i}{2} + \Sigma_{k=i+1}^{j} n_k}{N})")
+st.latex("IC(c_i, c_j) = -log(\\frac{\\frac{n_i}{2} + \\Sigma_{k=i+1}^{j} n_k}{N})")
 
 st.markdown("To be clear,")
 st.latex("IC(c_1, c_3) = -log(\\frac{n_1/2 + n_2 + n_3}{N})")
@@ -107,18 +156,14 @@ with st.form("paper_review_dist_form"):
     col1, col2 = st.columns(2, gap="small")
     with col1:
         st.markdown("### Journal $F$")
-        first_review_confusion_matrix_df = pd.read_csv(
-            "data/paper-review-example-01.csv", header=0
-        )
+        first_review_confusion_matrix_df = load_csv("data/paper-review-example-01.csv")
         first_review_confusion_matrix_df = st.data_editor(
             first_review_confusion_matrix_df, key="example_dist_1"
         )
 
     with col2:
         st.markdown("### Journal $S$")
-        second_review_confusion_matrix_df = pd.read_csv(
-            "data/paper-review-example-02.csv", header=0
-        )
+        second_review_confusion_matrix_df = load_csv("data/paper-review-example-02.csv")
         second_review_confusion_matrix_df = st.data_editor(
             second_review_confusion_matrix_df, key="example_dist_2"
         )
@@ -134,31 +179,36 @@ with col1:
         )
         st.pyplot(fig)
 
-        class_proximity_dict = get_class_proximity_dict_from_confusion_matrix(
+        class_proximity_matrix = compute_class_proximity_matrix(
             first_review_confusion_matrix_df
         )
+        class_names = first_review_confusion_matrix_df["class_name"].tolist()
 
         top_col1, top_col2 = st.columns(2)
         with top_col1:
             with st.container(border=True):
                 st.markdown("Top Closest")
-                top_closest = get_top_n_from_dict(
-                    class_proximity_dict, n=3, descending=True
+                top_closest = get_top_n_class_pairs(
+                    class_proximity_matrix, class_names, n=3, descending=True
                 )
-                for class_pair, proximity in top_closest:
+                for first_class, second_class, proximity in top_closest:
                     st.metric(
-                        label=class_pair, value=f"{proximity:.3f}", delta_color="off"
+                        label=f"{first_class}-{second_class}",
+                        value=f"{proximity:.3f}",
+                        delta_color="off",
                     )
 
         with top_col2:
             with st.container(border=True):
                 st.markdown("Top Furthest")
-                top_furthest = get_top_n_from_dict(
-                    class_proximity_dict, n=3, descending=False
+                top_furthest = get_top_n_class_pairs(
+                    class_proximity_matrix, class_names, n=3, descending=False
                 )
-                for class_pair, proximity in top_furthest:
+                for first_class, second_class, proximity in top_furthest:
                     st.metric(
-                        label=class_pair, value=f"{proximity:.3f}", delta_color="off"
+                        label=f"{first_class}-{second_class}",
+                        value=f"{proximity:.3f}",
+                        delta_color="off",
                     )
 
 with col2:
@@ -169,31 +219,36 @@ with col2:
         )
         st.pyplot(fig)
 
-        class_proximity_dict = get_class_proximity_dict_from_confusion_matrix(
+        class_proximity_matrix = compute_class_proximity_matrix(
             second_review_confusion_matrix_df
         )
+        class_names = second_review_confusion_matrix_df["class_name"].tolist()
 
         top_col1, top_col2 = st.columns(2)
         with top_col1:
             with st.container(border=True):
                 st.markdown("Top Closest")
-                top_closest = get_top_n_from_dict(
-                    class_proximity_dict, n=3, descending=True
+                top_closest = get_top_n_class_pairs(
+                    class_proximity_matrix, class_names, n=3, descending=True
                 )
-                for class_pair, proximity in top_closest:
+                for first_class, second_class, proximity in top_closest:
                     st.metric(
-                        label=class_pair, value=f"{proximity:.3f}", delta_color="off"
+                        label=f"{first_class}-{second_class}",
+                        value=f"{proximity:.3f}",
+                        delta_color="off",
                     )
 
         with top_col2:
             with st.container(border=True):
                 st.markdown("Top Furthest")
-                top_furthest = get_top_n_from_dict(
-                    class_proximity_dict, n=3, descending=False
+                top_furthest = get_top_n_class_pairs(
+                    class_proximity_matrix, class_names, n=3, descending=False
                 )
-                for class_pair, proximity in top_furthest:
+                for first_class, second_class, proximity in top_furthest:
                     st.metric(
-                        label=class_pair, value=f"{proximity:.3f}", delta_color="off"
+                        label=f"{first_class}-{second_class}",
+                        value=f"{proximity:.3f}",
+                        delta_color="off",
                     )
 
 description = """
@@ -248,11 +303,11 @@ with st.container(border=True):
         st.latex("m: D \\rightarrow C")
         st.latex("CEM(m, g)")
         st.latex("\\frac{ IC[m(d), g(d)]} {IC[g(d), g(d)]}")
-        st.latex("\Sigma_{d \in D}")
+        st.latex("\\Sigma_{d \\in D}")
 
 st.markdown("Put together, we have")
 st.latex(
-    "CEM(m, g) = \\frac{\Sigma_{d \in D} IC[m(d), g(d)]} {\Sigma_{d \in D} IC[g(d), g(d)]}"
+    "CEM(m, g) = \\frac{\\Sigma_{d \\in D} IC[m(d), g(d)]} {\\Sigma_{d \\in D} IC[g(d), g(d)]}"
 )
 
 st.markdown("## Metric Properties", unsafe_allow_html=True)
@@ -279,7 +334,7 @@ The coloring of the circles (
 <strong><span style='color: #98FB98;'>light green</span></strong>), depicts the data points' predictions. 
 In this data set, the $9$ predictions are exact matches to their true classes.
 
-**Second Dataset** is similar with $100\%$ match for other set of classes: $3$ *rejects*, $3$ *undecideds*, $3$ *weak accepts*.
+**Second Dataset** is similar with $100\\%$ match for other set of classes: $3$ *rejects*, $3$ *undecideds*, $3$ *weak accepts*.
 Its mere difference is that its groundtruth shifted their value to strictly higher-order classes.
 
 Therefore, Ordinal Invariance states that the metric value should remain the same if a dataset have its model output and groundtruth shift their value in a strictly higher-order classes.
@@ -292,16 +347,14 @@ with col1:
 
         st.markdown("### First Dataset")
         csv_path = "data/ordinal_invariance-example-01.csv"
-        first_ordinal_variance_df = pd.read_csv(csv_path, header=0)
+        first_ordinal_variance_df = load_csv(csv_path)
         fig = scatter_plot_from_confusion_matrix(first_ordinal_variance_df)
         st.pyplot(fig)
-        CEM_compute = ClosenessEvaluationMeasureCompute(
-            confusion_matrix=first_ordinal_variance_df.set_index("actual\predict"),
+        CEM_value_1 = compute_CEM_score(
+            first_ordinal_variance_df,
             class_names=["reject", "weak reject", "undecided", "weak accept", "accept"],
             orders=[1, 2, 3, 4, 5],
         )
-
-        CEM_value_1 = CEM_compute.get_proximity_between_two_dists()
         st.metric(label="CEM score", value=f"{CEM_value_1:.3f}")
 
 with col2:
@@ -309,16 +362,14 @@ with col2:
 
         st.markdown("### Second Dataset")
         csv_path = "data/ordinal_invariance-example-02.csv"
-        first_ordinal_variance_df = pd.read_csv(csv_path, header=0)
+        first_ordinal_variance_df = load_csv(csv_path)
         fig = scatter_plot_from_confusion_matrix(first_ordinal_variance_df)
         st.pyplot(fig)
-        CEM_compute = ClosenessEvaluationMeasureCompute(
-            confusion_matrix=first_ordinal_variance_df.set_index("actual\predict"),
+        CEM_value_2 = compute_CEM_score(
+            first_ordinal_variance_df,
             class_names=["reject", "weak reject", "undecided", "weak accept", "accept"],
             orders=[1, 2, 3, 4, 5],
         )
-
-        CEM_value_2 = CEM_compute.get_proximity_between_two_dists()
         st.metric(label="CEM score", value=f"{CEM_value_2:.3f}")
 
 st.markdown("### Monotonicity")
@@ -335,16 +386,14 @@ with col1:
 
         st.markdown("### First Dataset")
         csv_path = "data/monotonicity-example-01.csv"
-        first_ordinal_variance_df = pd.read_csv(csv_path, header=0)
+        first_ordinal_variance_df = load_csv(csv_path)
         fig = scatter_plot_from_confusion_matrix(first_ordinal_variance_df)
         st.pyplot(fig)
-        CEM_compute = ClosenessEvaluationMeasureCompute(
-            confusion_matrix=first_ordinal_variance_df.set_index("actual\predict"),
+        CEM_value_1 = compute_CEM_score(
+            first_ordinal_variance_df,
             class_names=["reject", "weak reject", "undecided", "weak accept", "accept"],
             orders=[1, 2, 3, 4, 5],
         )
-
-        CEM_value_1 = CEM_compute.get_proximity_between_two_dists()
         st.metric(label="CEM score", value=f"{CEM_value_1:.3f}")
 
 with col2:
@@ -352,16 +401,14 @@ with col2:
 
         st.markdown("### Second Dataset")
         csv_path = "data/monotonicity-example-02.csv"
-        first_ordinal_variance_df = pd.read_csv(csv_path, header=0)
+        first_ordinal_variance_df = load_csv(csv_path)
         fig = scatter_plot_from_confusion_matrix(first_ordinal_variance_df)
         st.pyplot(fig)
-        CEM_compute = ClosenessEvaluationMeasureCompute(
-            confusion_matrix=first_ordinal_variance_df.set_index("actual\predict"),
+        CEM_value_2 = compute_CEM_score(
+            first_ordinal_variance_df,
             class_names=["reject", "weak reject", "undecided", "weak accept", "accept"],
             orders=[1, 2, 3, 4, 5],
         )
-
-        CEM_value_2 = CEM_compute.get_proximity_between_two_dists()
         st.metric(
             label="CEM score",
             value=f"{CEM_value_2:.3f}",
@@ -387,16 +434,14 @@ with col1:
 
         st.markdown("### First Dataset")
         csv_path = "data/imbalance-example-01.csv"
-        first_ordinal_variance_df = pd.read_csv(csv_path, header=0)
+        first_ordinal_variance_df = load_csv(csv_path)
         fig = scatter_plot_from_confusion_matrix(first_ordinal_variance_df)
         st.pyplot(fig)
-        CEM_compute = ClosenessEvaluationMeasureCompute(
-            confusion_matrix=first_ordinal_variance_df.set_index("actual\predict"),
+        CEM_value_1 = compute_CEM_score(
+            first_ordinal_variance_df,
             class_names=["reject", "weak reject", "undecided", "weak accept", "accept"],
             orders=[1, 2, 3, 4, 5],
         )
-
-        CEM_value_1 = CEM_compute.get_proximity_between_two_dists()
         st.metric(label="CEM score", value=f"{CEM_value_1:.3f}")
 
 with col2:
@@ -404,16 +449,14 @@ with col2:
 
         st.markdown("### Second Dataset")
         csv_path = "data/imbalance-example-02.csv"
-        first_ordinal_variance_df = pd.read_csv(csv_path, header=0)
+        first_ordinal_variance_df = load_csv(csv_path)
         fig = scatter_plot_from_confusion_matrix(first_ordinal_variance_df)
         st.pyplot(fig)
-        CEM_compute = ClosenessEvaluationMeasureCompute(
-            confusion_matrix=first_ordinal_variance_df.set_index("actual\predict"),
+        CEM_value_2 = compute_CEM_score(
+            first_ordinal_variance_df,
             class_names=["reject", "weak reject", "undecided", "weak accept", "accept"],
             orders=[1, 2, 3, 4, 5],
         )
-
-        CEM_value_2 = CEM_compute.get_proximity_between_two_dists()
         st.metric(
             label="CEM score",
             value=f"{CEM_value_2:.3f}",
@@ -431,26 +474,28 @@ $CEM$ said otherwise and highlights that model $B$ should be the better performe
 
 It is indeed a true evaluation, in view that:
 - Model $A$ makes more mistakes between distant classes: *positive*-*negative* ($7+4 > 4+2$).
-- Model $A$ makes more mistakes in *positive*-*neutral*, whose population represent $90\%$ of the dataset, hence penalized more heavily, or precisely, earning less reward.
+- Model $A$ makes more mistakes in *positive*-*neutral*, whose population represent $90\\%$ of the dataset, hence penalized more heavily, or precisely, earning less reward.
 """
 st.markdown(description)
 
+# both models share the same groundtruth, hence are scored in one batch
+systemA_df = load_csv("data/systemA-confusion-matrix.csv")
+systemB_df = load_csv("data/systemB-confusion-matrix.csv")
+CEM_value_1, CEM_value_2 = compute_CEM_scores(
+    [systemA_df, systemB_df],
+    class_names=["negative", "neutral", "positive"],
+    orders=[1, 2, 3],
+)
+
 with st.container(border=True):
     col1, col2 = st.columns([3, 1])
     with col1:
         st.markdown("### Model $A$'s Confusion Matrix")
-        systemA_df = pd.read_csv("data/systemA-confusion-matrix.csv", header=0)
         systemA_df
     with col2:
-        CEM_compute = ClosenessEvaluationMeasureCompute(
-            confusion_matrix=systemA_df.set_index("actual\predict"),
-            class_names=["negative", "neutral", "positive"],
-            orders=[1, 2, 3],
-        )
         accuracy_1 = compute_accuracy_score(
-            systemA_df.set_index("actual\predict").values
+            systemA_df.set_index("actual\\predict").values
         )
-        CEM_value_1 = CEM_compute.get_proximity_between_two_dists()
         st.write("")
         st.write("")
         st.metric(label="Accuracy", value=f"{accuracy_1:.3f}")
@@ -460,18 +505,11 @@ with st.container(border=True):
     col1, col2 = st.columns([3, 1])
     with col1:
         st.markdown("### Model $B$'s Confusion Matrix")
-        systemB_df = pd.read_csv("data/systemB-confusion-matrix.csv", header=0)
         systemB_df
     with col2:
-        CEM_compute = ClosenessEvaluationMeasureCompute(
-            confusion_matrix=systemB_df.set_index("actual\predict"),
-            class_names=["negative", "neutral", "positive"],
-            orders=[1, 2, 3],
-        )
         accuracy_2 = compute_accuracy_score(
-            systemB_df.set_index("actual\predict").values
+            systemB_df.set_index("actual\\predict").values
         )
-        CEM_value_2 = CEM_compute.get_proximity_between_two_dists()
         st.write("")
         st.write("")
         st.metric(label="Accuracy", value=f"{accuracy_2:.3f}")
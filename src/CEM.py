@@ -1,9 +1,643 @@
 import math
-from typing import List
+from typing import Any, List, NamedTuple, Optional, Tuple, Union
 import numpy as np
-from src.ordinal_class_dist import OrdinalClassDistribution
+from src.cache import LRUCache, fingerprint_arrays
+from src.ordinal_class_dist import OrdinalClassDistribution, compute_cumulative_counts
 
 SCALE_FACTOR = math.log10(2)
+# K x K float64 tables, bounded in count and in total memory
+PROXIMITY_MATRIX_CACHE = LRUCache(maxsize=128, max_bytes=256 * 2**20)
+# items per chunk of the probability matrix, bounding the N x K temporaries
+SOFT_CEM_CHUNK_SIZE = 2**16
+
+
+def compute_proximity_matrix(
+    orders: np.ndarray, counts: np.ndarray, is_log_enabled: bool = True
+) -> np.ndarray:
+    """Compute the proximity between every pair of classes in one pass.
+
+    The sample count in between two classes is read off a cumulative count
+    over the classes sorted by order, hence the whole matrix costs O(K^2)
+    instead of O(K^3) with repeated per-pair computation.
+
+    Args:
+        orders (np.ndarray): class orders
+        counts (np.ndarray): class counts, aligned with orders. Leading
+            dimensions, if any, index a batch of distributions.
+        is_log_enabled (bool): whether to log-scale the proximity
+
+    Returns:
+        np.ndarray: (...) x K x K matrix, whose entry [i, j] is the proximity
+            between the i-th (first) and j-th (second) classes
+    """
+    orders = np.asarray(orders)
+    counts = np.asarray(counts, dtype=np.float64)
+    total_count = counts.sum(axis=-1)[..., np.newaxis, np.newaxis]
+    if np.any(total_count == 0):
+        raise ZeroDivisionError("Each class must have at least one sample.")
+
+    count_below, count_upto = compute_cumulative_counts(orders, counts)
+    in_between = count_below[..., np.newaxis, :] - count_upto[..., :, np.newaxis]
+    in_between = np.maximum(np.maximum(in_between, np.swapaxes(in_between, -1, -2)), 0)
+
+    numerator = counts[..., :, np.newaxis] / 2 + in_between + counts[..., np.newaxis, :]
+    diagonal_indices = np.arange(len(orders))
+    numerator[..., diagonal_indices, diagonal_indices] = counts / 2
+
+    proximity = numerator / total_count
+    if is_log_enabled:
+        with np.errstate(divide="ignore"):
+            proximity = -1 * np.log10(proximity) / SCALE_FACTOR
+    return proximity
+
+
+def compute_proximity_pairs(
+    orders: np.ndarray,
+    counts: np.ndarray,
+    first_indices: np.ndarray,
+    second_indices: np.ndarray,
+    is_log_enabled: bool = True,
+    group_indices: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Compute the proximity of the given class pairs only, so that cost and
+    memory scale with the number of pairs instead of K^2.
+
+    Args:
+        orders (np.ndarray): class orders
+        counts (np.ndarray): class counts, aligned with orders, or G x K
+            counts of G distributions
+        first_indices (np.ndarray): indices of the first class of each pair
+        second_indices (np.ndarray): indices of the second class of each pair
+        is_log_enabled (bool): whether to log-scale the proximity
+        group_indices (np.ndarray, optional): distribution of each pair, if
+            counts are G x K
+
+    Returns:
+        np.ndarray: proximity of each pair
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    total_count = counts.sum(axis=-1)
+    if np.any(total_count == 0):
+        raise ZeroDivisionError("Each class must have at least one sample.")
+    first_indices = np.asarray(first_indices)
+    second_indices = np.asarray(second_indices)
+    first_keys, second_keys = first_indices, second_indices
+    if group_indices is not None:
+        first_keys = (group_indices, first_indices)
+        second_keys = (group_indices, second_indices)
+        total_count = total_count[group_indices]
+
+    count_below, count_upto = compute_cumulative_counts(orders, counts)
+    in_between = np.maximum(
+        count_below[second_keys] - count_upto[first_keys],
+        count_below[first_keys] - count_upto[second_keys],
+    )
+    numerator = counts[first_keys] / 2 + np.where(
+        first_indices == second_indices,
+        0,
+        np.maximum(in_between, 0) + counts[second_keys],
+    )
+
+    proximity = numerator / total_count
+    if is_log_enabled:
+        with np.errstate(divide="ignore"):
+            proximity = -1 * np.log10(proximity) / SCALE_FACTOR
+    return proximity
+
+
+def get_cached_proximity_matrix(
+    orders: np.ndarray, counts: np.ndarray, is_log_enabled: bool = True
+) -> np.ndarray:
+    """Get the proximity matrix of a class distribution, memoized by a
+    fingerprint of its orders and counts, so repeated evaluations against the
+    same test set reuse it.
+
+    Args:
+        orders (np.ndarray): class orders
+        counts (np.ndarray): class counts, aligned with orders
+        is_log_enabled (bool): whether to log-scale the proximity
+
+    Returns:
+        np.ndarray: read-only K x K proximity matrix
+    """
+    orders = np.asarray(orders)
+    counts = np.asarray(counts, dtype=np.float64)
+    key = (fingerprint_arrays(orders, counts), is_log_enabled)
+
+    def compute() -> np.ndarray:
+        proximity_matrix = compute_proximity_matrix(orders, counts, is_log_enabled)
+        proximity_matrix.setflags(write=False)
+        return proximity_matrix
+
+    return PROXIMITY_MATRIX_CACHE.get_or_compute(key, compute)
+
+
+def set_proximity_matrix_cache_size(maxsize: int) -> None:
+    PROXIMITY_MATRIX_CACHE.resize(maxsize)
+
+
+def set_proximity_matrix_cache_max_bytes(max_bytes: Optional[int]) -> None:
+    PROXIMITY_MATRIX_CACHE.set_max_bytes(max_bytes)
+
+
+def encode_labels(labels: np.ndarray, class_names: Optional[List] = None) -> np.ndarray:
+    """Map labels to class indices.
+
+    Args:
+        labels (np.ndarray): labels, either class names or class indices
+        class_names (List, optional): class names, in the same order as the
+            class indices. If not given, labels must already be class indices.
+
+    Returns:
+        np.ndarray: class indices
+    """
+    labels = np.asarray(labels)
+    if class_names is None:
+        if labels.size and not np.issubdtype(labels.dtype, np.integer):
+            raise ValueError("Labels must be integer class indices.")
+        return labels.astype(np.intp, copy=False)
+
+    class_names = np.asarray(class_names)
+    sorted_indices = np.argsort(class_names, kind="stable")
+    sorted_class_names = class_names[sorted_indices]
+    positions = np.searchsorted(sorted_class_names, labels)
+    positions = np.minimum(positions, len(class_names) - 1)
+    if not np.all(sorted_class_names[positions] == labels):
+        raise ValueError("Labels must be one of the class names.")
+    return sorted_indices[positions]
+
+
+def check_class_indices(indices: np.ndarray, numb_classes: int) -> None:
+    if indices.size and (indices.min() < 0 or indices.max() >= numb_classes):
+        raise ValueError(f"Class indices must be in [0, {numb_classes}).")
+
+
+def encode_label_pairs(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    numb_classes: int,
+    class_names: Optional[List] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Map actual and predicted labels to flat arrays of valid class indices.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        numb_classes (int): number of classes
+        class_names (List, optional): class names, in the same order as the
+            class indices. If not given, labels must already be class indices.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: actual and predicted class indices
+    """
+    actual_indices = encode_labels(y_true, class_names)
+    predict_indices = encode_labels(y_pred, class_names)
+    if actual_indices.shape != predict_indices.shape:
+        raise ValueError("Actual and predicted labels must have the same shape.")
+    check_class_indices(actual_indices, numb_classes)
+    check_class_indices(predict_indices, numb_classes)
+    return actual_indices.ravel(), predict_indices.ravel()
+
+
+def compute_confusion_counts(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    numb_classes: int,
+    class_names: Optional[List] = None,
+) -> np.ndarray:
+    """Count the (actual, predict) label pairs into a dense confusion matrix.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        numb_classes (int): number of classes
+        class_names (List, optional): class names, in the same order as the
+            class indices. If not given, labels must already be class indices.
+
+    Returns:
+        np.ndarray: numb_classes x numb_classes counts, indexed by
+            [actual class, predict class]
+    """
+    actual_indices, predict_indices = encode_label_pairs(
+        y_true, y_pred, numb_classes, class_names
+    )
+    pair_indices = actual_indices.astype(np.int64) * numb_classes
+    pair_indices += predict_indices
+    confusion_counts = np.bincount(pair_indices, minlength=numb_classes**2)
+    return confusion_counts.reshape(numb_classes, numb_classes)
+
+
+def compute_cem_from_proximity_matrix(
+    confusion_counts: np.ndarray, proximity_matrix: np.ndarray
+) -> Union[float, np.ndarray]:
+    """Compute CEM of a confusion matrix, given the proximity matrix of its
+    actual class distribution.
+
+    Args:
+        confusion_counts (np.ndarray): counts, indexed by [actual, predict].
+            Leading dimensions, if any, index a batch of confusion matrices.
+        proximity_matrix (np.ndarray): log-scaled proximity between classes,
+            batched alike
+
+    Returns:
+        Union[float, np.ndarray]: CEM, one per confusion matrix if batched
+    """
+    confusion_counts = np.asarray(confusion_counts)
+    actual_counts = confusion_counts.sum(axis=-1)
+
+    # cells without sample are skipped, their proximity may be infinite
+    predict_vs_actual = np.swapaxes(proximity_matrix, -1, -2)
+    sum_numerator = np.sum(
+        confusion_counts * np.where(confusion_counts > 0, predict_vs_actual, 0),
+        axis=(-2, -1),
+    )
+    actual_vs_actual = np.diagonal(proximity_matrix, axis1=-2, axis2=-1)
+    sum_denominator = np.sum(
+        actual_counts * np.where(actual_counts > 0, actual_vs_actual, 0), axis=-1
+    )
+    proximity = sum_numerator / sum_denominator
+    if np.ndim(proximity) == 0:
+        return float(proximity)
+    return proximity
+
+
+def compute_cem_from_confusion_counts(
+    confusion_counts: np.ndarray, orders: List[int]
+) -> float:
+    """Compute CEM of a dense confusion matrix of counts.
+
+    Args:
+        confusion_counts (np.ndarray): counts, indexed by [actual, predict]
+        orders (List[int]): class orders, aligned with the matrix axes
+
+    Returns:
+        float: CEM
+    """
+    confusion_counts = np.asarray(confusion_counts)
+    proximity_matrix = get_cached_proximity_matrix(
+        orders, confusion_counts.sum(axis=1)
+    )
+    return compute_cem_from_proximity_matrix(confusion_counts, proximity_matrix)
+
+
+def compute_cem_from_sparse_counts(
+    confusion_counts: Union[Any, Tuple[np.ndarray, np.ndarray, np.ndarray]],
+    orders: List[int],
+) -> float:
+    """Compute CEM of a sparse confusion matrix, visiting its non-zero cells
+    only, hence memory scales with them instead of K^2.
+
+    Args:
+        confusion_counts (Union[Any, Tuple[np.ndarray, np.ndarray, np.ndarray]]):
+            a sparse matrix exposing tocoo() (e.g. scipy.sparse COO/CSR), or
+            (actual indices, predict indices, counts) triplets
+        orders (List[int]): class orders, aligned with the matrix axes
+
+    Returns:
+        float: CEM
+    """
+    if hasattr(confusion_counts, "tocoo"):
+        confusion_counts = confusion_counts.tocoo()
+        confusion_counts = (
+            confusion_counts.row,
+            confusion_counts.col,
+            confusion_counts.data,
+        )
+    actual_indices, predict_indices, sample_counts = map(np.asarray, confusion_counts)
+    check_class_indices(actual_indices, len(orders))
+    check_class_indices(predict_indices, len(orders))
+    is_nonzero = sample_counts != 0
+    actual_indices = actual_indices[is_nonzero]
+    predict_indices = predict_indices[is_nonzero]
+    sample_counts = sample_counts[is_nonzero]
+
+    actual_counts = np.bincount(
+        actual_indices, weights=sample_counts, minlength=len(orders)
+    )
+    sum_numerator = sample_counts @ compute_proximity_pairs(
+        orders, actual_counts, predict_indices, actual_indices
+    )
+    observed_indices = np.flatnonzero(actual_counts)
+    sum_denominator = actual_counts[observed_indices] @ compute_proximity_pairs(
+        orders, actual_counts, observed_indices, observed_indices
+    )
+    return float(sum_numerator / sum_denominator)
+
+
+def compute_cem_batch(confusion_counts: np.ndarray, orders: List[int]) -> np.ndarray:
+    """Compute CEM of a stack of confusion matrices, e.g. of many systems or
+    checkpoints, evaluated against the same actual labels.
+
+    The proximity matrix of the shared actual class distribution is computed
+    once, and all scores come out of a single tensor contraction.
+
+    Args:
+        confusion_counts (np.ndarray): S x K x K counts, indexed by
+            [system, actual, predict]
+        orders (List[int]): class orders, aligned with the matrix axes
+
+    Returns:
+        np.ndarray: S CEM scores
+    """
+    confusion_counts = np.asarray(confusion_counts)
+    if confusion_counts.ndim != 3:
+        raise ValueError("Expect a stack of confusion matrices of shape (S, K, K).")
+    actual_counts = confusion_counts.sum(axis=2)
+    if not np.all(actual_counts == actual_counts[0]):
+        raise ValueError("All confusion matrices must share the same actual labels.")
+    actual_counts = actual_counts[0]
+
+    proximity_matrix = get_cached_proximity_matrix(orders, actual_counts)
+    # rows of classes without sample hold no count, their proximity may be infinite
+    is_observed = actual_counts > 0
+    reward_matrix = np.where(is_observed[:, np.newaxis], proximity_matrix.T, 0)
+    sum_numerators = np.tensordot(confusion_counts, reward_matrix, axes=([1, 2], [0, 1]))
+    sum_denominator = np.sum(
+        actual_counts * np.where(is_observed, np.diag(proximity_matrix), 0)
+    )
+    return sum_numerators / sum_denominator
+
+
+def compute_cem_from_labels(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+) -> float:
+    """Compute CEM directly from actual and predicted labels.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+
+    Returns:
+        float: CEM
+    """
+    confusion_counts = compute_confusion_counts(
+        y_true, y_pred, numb_classes=len(orders), class_names=class_names
+    )
+    return compute_cem_from_confusion_counts(confusion_counts, orders)
+
+
+class ItemContributions(NamedTuple):
+    numerators: np.ndarray
+    denominators: np.ndarray
+
+    def to_arrow(self):
+        """Wrap the contributions, without copy, as an Arrow table of
+        `numerator` and `denominator` columns."""
+        import pyarrow as pa
+
+        return pa.table({"numerator": self.numerators, "denominator": self.denominators})
+
+
+def compute_item_contributions(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+) -> ItemContributions:
+    """Compute the contribution of each item to the CEM numerator, the
+    proximity of its prediction to its actual class, and to the denominator,
+    the proximity of its actual class to itself.
+
+    Both are gathered at once from the proximity matrix of the actual class
+    distribution, and CEM is the sum of numerators over the sum of
+    denominators, so the lowest numerators point to the predictions which
+    hurt CEM most.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+
+    Returns:
+        ItemContributions: numerator and denominator of each item
+    """
+    numb_classes = len(orders)
+    actual_indices, predict_indices = encode_label_pairs(
+        y_true, y_pred, numb_classes, class_names
+    )
+    actual_counts = np.bincount(actual_indices, minlength=numb_classes)
+    flat_proximity_matrix = get_cached_proximity_matrix(orders, actual_counts).ravel()
+
+    cell_indices = predict_indices.astype(np.int64) * numb_classes + actual_indices
+    numerators = flat_proximity_matrix.take(cell_indices)
+    np.multiply(actual_indices, numb_classes + 1, out=cell_indices)
+    denominators = flat_proximity_matrix.take(cell_indices)
+    return ItemContributions(numerators=numerators, denominators=denominators)
+
+
+def compute_soft_cem(
+    y_true: np.ndarray,
+    y_prob: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+    chunk_size: int = SOFT_CEM_CHUNK_SIZE,
+) -> float:
+    """Compute the expected CEM of probabilistic predictions, each item
+    contributing the proximity of every class to its actual class, weighted
+    by the predicted probability of that class.
+
+    Items are scored chunk by chunk, gathering the proximity row of their
+    actual class and taking its dot product with their probabilities.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_prob (np.ndarray): N x K predicted probabilities, whose columns are
+            aligned with orders and whose rows sum to 1
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+        chunk_size (int): number of items per chunk
+
+    Returns:
+        float: soft CEM
+    """
+    numb_classes = len(orders)
+    actual_indices = encode_labels(y_true, class_names).ravel()
+    check_class_indices(actual_indices, numb_classes)
+    if np.ndim(y_prob) != 2 or np.shape(y_prob) != (len(actual_indices), numb_classes):
+        raise ValueError(
+            f"Expect probabilities of shape {(len(actual_indices), numb_classes)}, "
+            f"got {np.shape(y_prob)}."
+        )
+
+    actual_counts = np.bincount(actual_indices, minlength=numb_classes)
+    proximity_matrix = get_cached_proximity_matrix(orders, actual_counts)
+    # row a holds the proximity of every predicted class to actual class a
+    predict_vs_actual = np.ascontiguousarray(proximity_matrix.T)
+
+    sum_numerator = 0.0
+    for start in range(0, len(actual_indices), chunk_size):
+        chunk_actual_indices = actual_indices[start : start + chunk_size]
+        chunk_probs = np.asarray(y_prob[start : start + chunk_size], dtype=np.float64)
+        sum_numerator += np.einsum(
+            "ij,ij->", chunk_probs, predict_vs_actual[chunk_actual_indices]
+        )
+    observed = actual_counts > 0
+    sum_denominator = np.dot(actual_counts[observed], np.diagonal(proximity_matrix)[observed])
+    return float(sum_numerator / sum_denominator)
+
+
+class GroupedCEM(NamedTuple):
+    group_ids: np.ndarray
+    scores: np.ndarray
+    global_score: float
+
+
+def encode_group_cells(
+    group_ids: np.ndarray,
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    numb_classes: int,
+    class_names: Optional[List] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode the (group, actual, predict) triplet of every item as the flat
+    index of its cell in a G x K x K confusion tensor.
+
+    Args:
+        group_ids (np.ndarray): group of each item, e.g. language or domain
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        numb_classes (int): number of classes
+        class_names (List, optional): class names, in the same order as the
+            class indices. If not given, labels must already be class indices.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: sorted unique group ids, and cell index
+            of each item
+    """
+    actual_indices, predict_indices = encode_label_pairs(
+        y_true, y_pred, numb_classes, class_names
+    )
+    unique_group_ids, group_indices = np.unique(
+        np.asarray(group_ids).ravel(), return_inverse=True
+    )
+    if group_indices.shape != actual_indices.shape:
+        raise ValueError("Group ids and labels must have the same shape.")
+
+    cell_indices = group_indices.astype(np.int64) * numb_classes + actual_indices
+    cell_indices *= numb_classes
+    cell_indices += predict_indices
+    return unique_group_ids, cell_indices
+
+
+def compute_confusion_counts_by_group(
+    group_ids: np.ndarray,
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    numb_classes: int,
+    class_names: Optional[List] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Count the (actual, predict) label pairs of every group with a single
+    bincount.
+
+    Args:
+        group_ids (np.ndarray): group of each item, e.g. language or domain
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        numb_classes (int): number of classes
+        class_names (List, optional): class names, in the same order as the
+            class indices. If not given, labels must already be class indices.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: sorted unique group ids, and
+            G x K x K counts indexed by [group, actual, predict]
+    """
+    unique_group_ids, cell_indices = encode_group_cells(
+        group_ids, y_true, y_pred, numb_classes, class_names
+    )
+    numb_groups = len(unique_group_ids)
+    confusion_counts = np.bincount(
+        cell_indices, minlength=numb_groups * numb_classes**2
+    )
+    return unique_group_ids, confusion_counts.reshape(
+        numb_groups, numb_classes, numb_classes
+    )
+
+
+def compute_cem_by_group(
+    group_ids: np.ndarray,
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+) -> GroupedCEM:
+    """Compute CEM of every group of items, e.g. per language, domain or
+    annotator, along with the global CEM, in a single pass.
+
+    Each group is scored against the proximity of its own actual class
+    distribution. All groups are scored at once over the non-zero cells of
+    their confusion matrices, so memory scales with the items and G x K, not
+    with G x K x K.
+
+    Args:
+        group_ids (np.ndarray): group of each item
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+
+    Returns:
+        GroupedCEM: sorted unique group ids, CEM per group and global CEM
+    """
+    numb_classes = len(orders)
+    unique_group_ids, cell_indices = encode_group_cells(
+        group_ids, y_true, y_pred, numb_classes, class_names
+    )
+    numb_groups = len(unique_group_ids)
+    cell_indices, cell_counts = np.unique(cell_indices, return_counts=True)
+    group_indices, actual_indices, predict_indices = np.unravel_index(
+        cell_indices, (numb_groups, numb_classes, numb_classes)
+    )
+    actual_counts = np.bincount(
+        group_indices * numb_classes + actual_indices,
+        weights=cell_counts,
+        minlength=numb_groups * numb_classes,
+    ).reshape(numb_groups, numb_classes)
+
+    cell_proximities = compute_proximity_pairs(
+        orders,
+        actual_counts,
+        predict_indices,
+        actual_indices,
+        group_indices=group_indices,
+    )
+    sum_numerators = np.bincount(
+        group_indices, weights=cell_counts * cell_proximities, minlength=numb_groups
+    )
+    observed_group_indices, observed_actual_indices = np.nonzero(actual_counts)
+    class_proximities = compute_proximity_pairs(
+        orders,
+        actual_counts,
+        observed_actual_indices,
+        observed_actual_indices,
+        group_indices=observed_group_indices,
+    )
+    sum_denominators = np.bincount(
+        observed_group_indices,
+        weights=actual_counts[observed_group_indices, observed_actual_indices]
+        * class_proximities,
+        minlength=numb_groups,
+    )
+
+    global_confusion_counts = np.bincount(
+        actual_indices * numb_classes + predict_indices,
+        weights=cell_counts,
+        minlength=numb_classes**2,
+    ).reshape(numb_classes, numb_classes)
+    return GroupedCEM(
+        group_ids=unique_group_ids,
+        scores=sum_numerators / sum_denominators,
+        global_score=compute_cem_from_confusion_counts(global_confusion_counts, orders),
+    )
 
 
 class ClosenessInformationQuantityCompute:
@@ -54,13 +688,52 @@ class ClosenessInformationQuantityCompute:
             proximity = -1 * math.log10(proximity) / SCALE_FACTOR
         return proximity
 
+    def get_proximity_matrix(
+        self, class_names: Optional[List[str]] = None, is_log_enabled: bool = True
+    ) -> np.ndarray:
+        """Get the proximity between every pair of classes, vectorized.
+
+        Args:
+            class_names (List[str], optional): class names to index the matrix
+                with, default to all classes of the distribution
+            is_log_enabled (bool): whether to log-scale the proximity
+
+        Returns:
+            np.ndarray: proximity matrix, whose entry [i, j] equals
+                get_proximity_between_two_classes(class_names[i], class_names[j])
+        """
+        ordinal_dist = self.ordinal_dist
+        if class_names is None:
+            class_names = ordinal_dist.class_names
+
+        # unknown classes have order 0 and no sample, as in the per-pair API
+        class_index_mapping = dict(ordinal_dist.class_index_mapping)
+        numb_unknown_classes = 0
+        for class_name in class_names:
+            if class_name not in class_index_mapping:
+                class_index_mapping[class_name] = (
+                    len(ordinal_dist.class_names) + numb_unknown_classes
+                )
+                numb_unknown_classes += 1
+        orders = np.concatenate(
+            (ordinal_dist.class_orders, np.zeros(numb_unknown_classes, dtype=int))
+        )
+        counts = np.concatenate(
+            (ordinal_dist.counts, np.zeros(numb_unknown_classes, dtype=int))
+        )
+        proximity_matrix = get_cached_proximity_matrix(orders, counts, is_log_enabled)
+
+        indices = [class_index_mapping[class_name] for class_name in class_names]
+        return proximity_matrix[np.ix_(indices, indices)]
+
 
 class ClosenessEvaluationMeasureCompute:
     """
     Initializes an instance of the class.
 
     Args/Attributes:
-        confusion_matrix (np.array): The confusion matrix.
+        confusion_matrix (np.array): The confusion matrix, either a pandas DataFrame indexed by class names
+            or an array whose axes follow the order of class names.
         class_names (List[str]): The list of class names.
         orders (List[int]): The list of class orders.
 
@@ -88,53 +761,44 @@ class ClosenessEvaluationMeasureCompute:
         Calculate the proximity between two distributions.
 
         This function calculates the proximity between two distributions based on the given confusion matrix, class names, and orders.
+        The proximity matrix of the actual distribution is looked up in a cache shared by all instances.
 
         Returns:
             float: The proximity between the two distributions.
         """
+        confusion_counts = self.get_confusion_counts()
+        proximity_matrix = get_cached_proximity_matrix(
+            self.orders, confusion_counts.sum(axis=1)
+        )
+        return compute_cem_from_proximity_matrix(confusion_counts, proximity_matrix)
 
-        sum_numerator = 0
-        sum_denominator = 0
-
-        for actual_class in self.class_names:
-            for predict_class in self.class_names:
-                n_samples = self.confusion_matrix.loc[actual_class][predict_class]
-                if n_samples == 0:
-                    continue
-
-                proximity_predict_vs_actual = (
-                    self.CIQ_compute.get_proximity_between_two_classes(
-                        predict_class, actual_class
-                    )
-                )
-                sum_numerator += n_samples * proximity_predict_vs_actual
-
-                proximity_actual_vs_actual = (
-                    self.CIQ_compute.get_proximity_between_two_classes(
-                        actual_class, actual_class
-                    )
-                )
-                sum_denominator += n_samples * proximity_actual_vs_actual
+    def get_confusion_counts(self) -> np.ndarray:
+        """Get the counts of the confusion matrix, with both axes in the order
+        of class names.
 
-        proximity = sum_numerator / sum_denominator
-        return proximity
+        Returns:
+            np.ndarray: counts, indexed by [actual, predict]
+        """
+        if not hasattr(self.confusion_matrix, "loc"):
+            # an array is already in the order of class names
+            return np.asarray(self.confusion_matrix)
+        return self.confusion_matrix.loc[self.class_names, self.class_names].to_numpy()
 
     def get_proximity_matrix(self):
         """
         Calculate the proximity matrix based on the confusion matrix and class names.
 
         Returns:
-            pandas.DataFrame: The proximity matrix.
+            pandas.DataFrame: The proximity matrix, or np.ndarray if the confusion matrix is an array.
         """
+        if not hasattr(self.confusion_matrix, "loc"):
+            return self.CIQ_compute.get_proximity_matrix(self.class_names)
+
         proximity_matrix = 1.0 * self.confusion_matrix.copy()
         proximity_matrix.index.name = ""
-        for first_actual_class in self.class_names:
-            for second_actual_class in self.class_names:
-                proximity_matrix.at[first_actual_class, second_actual_class] = (
-                    self.CIQ_compute.get_proximity_between_two_classes(
-                        first_class=first_actual_class, second_class=second_actual_class
-                    )
-                )
+        proximity_matrix.loc[self.class_names, self.class_names] = (
+            self.CIQ_compute.get_proximity_matrix(self.class_names)
+        )
 
         return proximity_matrix
 
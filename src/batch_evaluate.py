@@ -0,0 +1,157 @@
+"""Score a batch of confusion matrix files with CEM and accuracy.
+
+Usage (from the repository root):
+    python -m src.batch_evaluate data/ --output report.csv
+    python -m src.batch_evaluate "runs/**/*.csv" --orders 1 2 3 --output report.parquet
+
+Each file holds a confusion matrix in any format of src.io_utils, e.g. the CSV
+format of data/: an `actual\\predict` column of actual class names followed by
+one column per predicted class, classes being listed from the lowest to the
+highest order.
+"""
+
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from src.CEM import compute_cem_from_confusion_counts
+from src.io_utils import CONFUSION_MATRIX_SUFFIXES, load_confusion_matrix
+from src.utils import compute_accuracy_score
+
+# workers only score files, pandas is imported to build the report
+if TYPE_CHECKING:
+    import pandas as pd
+
+REPORT_COLUMNS = ["file", "numb_classes", "numb_samples", "accuracy", "CEM", "error"]
+
+
+def find_input_files(inputs: List[str], pattern: str = "*") -> List[str]:
+    """Expand directories (with pattern) and glob expressions into a sorted
+    list of files, keeping supported confusion matrix formats only.
+
+    Args:
+        inputs (List[str]): files, directories or glob expressions
+        pattern (str): file pattern to match in directories
+
+    Returns:
+        List[str]: file paths
+    """
+    file_paths = set()
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            file_paths.update(glob.glob(os.path.join(input_path, pattern)))
+        elif os.path.isfile(input_path):
+            file_paths.add(input_path)
+        else:
+            file_paths.update(glob.glob(input_path, recursive=True))
+    return sorted(
+        path
+        for path in file_paths
+        if os.path.isfile(path) and path.lower().endswith(CONFUSION_MATRIX_SUFFIXES)
+    )
+
+
+def evaluate_file(file_path: str, orders: Optional[List[int]] = None) -> Dict:
+    """Compute CEM and accuracy of a confusion matrix file.
+
+    Args:
+        file_path (str): path of the confusion matrix
+        orders (List[int], optional): class orders, aligned with the columns.
+            Default to the orders stored in the file, else the column positions.
+
+    Returns:
+        Dict: a report row, whose error is set instead of the scores if the
+            file could not be scored
+    """
+    report_row = dict.fromkeys(REPORT_COLUMNS)
+    report_row["file"] = file_path
+    try:
+        confusion_counts, _, file_orders = load_confusion_matrix(file_path)
+        numb_classes = confusion_counts.shape[0]
+        if orders is None:
+            orders = file_orders
+        elif len(orders) != numb_classes:
+            raise ValueError(f"Expect {numb_classes} orders, got {len(orders)}.")
+
+        report_row["numb_classes"] = numb_classes
+        report_row["numb_samples"] = int(confusion_counts.sum())
+        report_row["accuracy"] = float(compute_accuracy_score(confusion_counts))
+        report_row["CEM"] = compute_cem_from_confusion_counts(confusion_counts, orders)
+    except Exception as error:
+        report_row["error"] = f"{type(error).__name__}: {error}"
+    return report_row
+
+
+def evaluate_files(
+    file_paths: List[str], orders: Optional[List[int]] = None, n_jobs: int = 1
+) -> "pd.DataFrame":
+    """Score files over a process pool into one report.
+
+    Args:
+        file_paths (List[str]): paths of the confusion matrices
+        orders (List[int], optional): class orders shared by all files
+        n_jobs (int): number of worker processes
+
+    Returns:
+        pd.DataFrame: one row per file
+    """
+    if n_jobs == 1 or len(file_paths) <= 1:
+        report_rows = [evaluate_file(file_path, orders) for file_path in file_paths]
+    else:
+        chunksize = max(1, len(file_paths) // (4 * n_jobs))
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            report_rows = list(
+                executor.map(
+                    evaluate_file,
+                    file_paths,
+                    [orders] * len(file_paths),
+                    chunksize=chunksize,
+                )
+            )
+    import pandas as pd
+
+    report = pd.DataFrame(report_rows, columns=REPORT_COLUMNS)
+    # files which failed have no count, keep the others as integers
+    return report.astype({"numb_classes": "Int64", "numb_samples": "Int64"})
+
+
+def write_report(report: "pd.DataFrame", output_path: Optional[str]) -> None:
+    if output_path is None:
+        report.to_csv(sys.stdout, index=False)
+    elif output_path.endswith(".parquet"):
+        report.to_parquet(output_path, index=False)
+    else:
+        report.to_csv(output_path, index=False)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="files, directories or glob expressions")
+    parser.add_argument("--pattern", default="*", help="file pattern in directories")
+    parser.add_argument("--orders", type=int, nargs="+", help="class orders of all files")
+    parser.add_argument("--output", help="report path (.csv or .parquet), default to stdout")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    file_paths = find_input_files(args.inputs, args.pattern)
+    if not file_paths:
+        print("No input file found.", file=sys.stderr)
+        return 1
+
+    report = evaluate_files(file_paths, orders=args.orders, n_jobs=args.jobs)
+    write_report(report, args.output)
+
+    failed_report = report[report["error"].notna()]
+    for file_path, error in zip(failed_report["file"], failed_report["error"]):
+        print(f"{file_path}: {error}", file=sys.stderr)
+    return 1 if len(failed_report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
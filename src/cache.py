@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import numpy as np
+
+
+class LRUCache:
+    """A thread-safe mapping which evicts its least recently used entries once
+    it holds more than maxsize of them, or more than max_bytes of arrays.
+
+    Args:
+        maxsize (int): maximum number of entries, 0 to disable caching
+        max_bytes (int, optional): maximum total nbytes of the values, values
+            larger than it are not cached. Default to no limit.
+    Attributes:
+        maxsize: maximum number of entries
+        max_bytes: maximum total nbytes of the values, or None
+        nbytes: total nbytes of the values
+        hits: number of lookups found in the cache
+        misses: number of lookups not found in the cache
+
+    """
+
+    def __init__(self, maxsize: int = 128, max_bytes: Optional[int] = None) -> None:
+        if maxsize < 0:
+            raise ValueError("Cache size must be non-negative.")
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("Cache byte limit must be non-negative.")
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        nbytes = get_nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= get_nbytes(self._entries.pop(key))
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return
+            self._entries[key] = value
+            self.nbytes += nbytes
+            self._evict()
+
+    def get_or_compute(self, key: Hashable, compute_func: Callable[[], Any]) -> Any:
+        """Get the value of key, computing and caching it on a miss.
+
+        Args:
+            key (Hashable): cache key
+            compute_func (Callable[[], Any]): computes the value of key
+
+        Returns:
+            Any: cached or computed value
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute_func()
+            self.put(key, value)
+        return value
+
+    def resize(self, maxsize: int) -> None:
+        if maxsize < 0:
+            raise ValueError("Cache size must be non-negative.")
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def set_max_bytes(self, max_bytes: Optional[int]) -> None:
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("Cache byte limit must be non-negative.")
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.maxsize or (
+            self.max_bytes is not None and self.nbytes > self.max_bytes
+        ):
+            _, value = self._entries.popitem(last=False)
+            self.nbytes -= get_nbytes(value)
+
+
+def get_nbytes(value: Any) -> int:
+    """Get the memory held by a cached value, counting arrays only."""
+    return getattr(value, "nbytes", 0)
+
+
+def fingerprint_arrays(*arrays: np.ndarray) -> str:
+    """Hash the dtype, shape and content of arrays into a short hex digest.
+
+    Args:
+        *arrays (np.ndarray): arrays to fingerprint
+
+    Returns:
+        str: fingerprint
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        hasher.update(f"{array.dtype.str}{array.shape}".encode())
+        hasher.update(array.tobytes())
+    return hasher.hexdigest()
@@ -0,0 +1,101 @@
+from typing import List
+import numpy as np
+
+from src.CEM import ClosenessInformationQuantityCompute
+from src.ordinal_class_dist import OrdinalClassDistribution
+
+# items per chunk of the probability matrix, bounding the N x K scores
+DECODING_CHUNK_SIZE = 2**16
+
+
+class ClosenessEvaluationMeasureDecoder:
+    """Decode predicted probabilities into the class which maximizes the
+    expected CEM numerator, i.e. the proximity of the prediction to the actual
+    class, averaged over the predicted probabilities of the actual class.
+
+    Proximities follow the prior distribution of actual classes, e.g. the
+    class distribution of the training set, so that all items are scored
+    against the same table with a single matrix product.
+
+    Args:
+        ordinal_dist (OrdinalClassDistribution): prior distribution of the
+            actual classes, whose counts must be positive
+    Attributes:
+        ordinal_dist: prior distribution of the actual classes
+        class_names: List of class names, aligned with the probability columns
+        proximity_matrix: proximity between classes, indexed by
+            [predict, actual]
+
+    """
+
+    def __init__(self, ordinal_dist: OrdinalClassDistribution) -> None:
+        if np.any(ordinal_dist.counts <= 0):
+            # classes without prior sample have an infinite proximity to themselves
+            raise ValueError("Prior counts must be positive.")
+        self.ordinal_dist = ordinal_dist
+        self.class_names = list(ordinal_dist.class_names)
+        self.proximity_matrix = ClosenessInformationQuantityCompute(
+            ordinal_dist
+        ).get_proximity_matrix()
+        # scores = probabilities @ actual_vs_predict
+        self._actual_vs_predict = np.ascontiguousarray(self.proximity_matrix.T)
+
+    def get_expected_proximities(self, y_prob: np.ndarray) -> np.ndarray:
+        """Compute the expected proximity of every candidate prediction.
+
+        Args:
+            y_prob (np.ndarray): N x K predicted probabilities, whose columns
+                are aligned with class_names
+
+        Returns:
+            np.ndarray: N x K expected proximities, indexed by [item, predict]
+        """
+        return self._check_probabilities(y_prob) @ self._actual_vs_predict
+
+    def decode(
+        self, y_prob: np.ndarray, chunk_size: int = DECODING_CHUNK_SIZE
+    ) -> np.ndarray:
+        """Get the class index maximizing the expected proximity of each item.
+
+        Args:
+            y_prob (np.ndarray): N x K predicted probabilities, whose columns
+                are aligned with class_names
+            chunk_size (int): number of items per matrix product
+
+        Returns:
+            np.ndarray: decoded class indices
+        """
+        y_prob = self._check_probabilities(y_prob)
+        numb_items, numb_classes = y_prob.shape
+        predict_indices = np.empty(numb_items, dtype=np.int64)
+        scores = np.empty((min(chunk_size, numb_items), numb_classes))
+        for start in range(0, numb_items, chunk_size):
+            chunk_probs = y_prob[start : start + chunk_size]
+            chunk_scores = scores[: len(chunk_probs)]
+            np.matmul(chunk_probs, self._actual_vs_predict, out=chunk_scores)
+            np.argmax(chunk_scores, axis=1, out=predict_indices[start : start + chunk_size])
+        return predict_indices
+
+    def decode_labels(
+        self, y_prob: np.ndarray, chunk_size: int = DECODING_CHUNK_SIZE
+    ) -> List:
+        """Get the class name maximizing the expected proximity of each item.
+
+        Args:
+            y_prob (np.ndarray): N x K predicted probabilities, whose columns
+                are aligned with class_names
+            chunk_size (int): number of items per matrix product
+
+        Returns:
+            List: decoded class names
+        """
+        return [self.class_names[index] for index in self.decode(y_prob, chunk_size)]
+
+    def _check_probabilities(self, y_prob: np.ndarray) -> np.ndarray:
+        y_prob = np.asarray(y_prob, dtype=np.float64)
+        if y_prob.ndim != 2 or y_prob.shape[1] != len(self.class_names):
+            raise ValueError(
+                f"Expect probabilities of shape (N, {len(self.class_names)}), "
+                f"got {y_prob.shape}."
+            )
+        return y_prob
@@ -0,0 +1,349 @@
+import json
+import os
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+
+from src.CEM import ClosenessEvaluationMeasureCompute
+from src.ordinal_class_dist import OrdinalClassDistribution
+from src.streaming import ClosenessEvaluationMeasureAccumulator
+
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+CONFUSION_MATRIX_SUFFIXES = (".csv", ".parquet", ".npy", ".npz") + ARROW_SUFFIXES
+# .npy files from this size on are memory-mapped instead of read
+MMAP_MIN_BYTES = 64 * 1024**2
+DEFAULT_CHUNK_SIZE = 2**22
+
+ConfusionMatrixData = Tuple[np.ndarray, List[str], List[int]]
+
+
+def get_suffix(path: str) -> str:
+    return os.path.splitext(path)[1].lower()
+
+
+def get_metadata_path(npy_path: str) -> str:
+    return os.path.splitext(npy_path)[0] + ".json"
+
+
+def get_default_class_names(numb_classes: int) -> List[str]:
+    return [str(index) for index in range(numb_classes)]
+
+
+def read_arrow_table(path: str):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if get_suffix(path) == ".parquet":
+        return pq.read_table(path, memory_map=True)
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def write_arrow_table(path: str, table) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if get_suffix(path) == ".parquet":
+        pq.write_table(table, path)
+        return
+    # uncompressed, so that reading back is zero-copy over the memory map
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_table_metadata(table) -> Tuple[Optional[List[str]], Optional[List[int]]]:
+    metadata = table.schema.metadata or dict()
+    class_names = metadata.get(b"class_names")
+    orders = metadata.get(b"orders")
+    return (
+        None if class_names is None else json.loads(class_names),
+        None if orders is None else json.loads(orders),
+    )
+
+
+def column_to_numpy(column) -> np.ndarray:
+    if column.num_chunks == 1 and column.null_count == 0:
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return column.to_numpy()
+
+
+def load_confusion_matrix(path: str) -> ConfusionMatrixData:
+    """Load a confusion matrix along with its class names and orders.
+
+    Supported formats:
+        - .csv: the actual\\predict layout of data/, classes listed in order
+        - .parquet/.arrow/.feather/.ipc: a "counts" column holding the matrix
+          flattened row-major, class names and orders in the schema metadata
+        - .npz: "counts", "class_names" and "orders" arrays
+        - .npy: the counts matrix, class names and orders in a sibling .json.
+          Large files are memory-mapped.
+
+    Args:
+        path (str): path of the confusion matrix
+
+    Returns:
+        ConfusionMatrixData: counts indexed by [actual, predict], class names
+            and orders. Orders default to the class positions.
+    """
+    suffix = get_suffix(path)
+    class_names, orders = None, None
+    if suffix == ".csv":
+        import pandas as pd
+
+        confusion_matrix = pd.read_csv(path, index_col=0, encoding="utf-8-sig")
+        class_names = confusion_matrix.columns.tolist()
+        if sorted(map(str, confusion_matrix.index)) != sorted(map(str, class_names)):
+            raise ValueError("Actual and predicted classes differ, not a confusion matrix.")
+        confusion_matrix.index = confusion_matrix.index.astype(str)
+        confusion_counts = confusion_matrix.loc[class_names, class_names].to_numpy()
+    elif suffix == ".parquet" or suffix in ARROW_SUFFIXES:
+        table = read_arrow_table(path)
+        class_names, orders = read_table_metadata(table)
+        confusion_counts = column_to_numpy(table.column("counts"))
+        numb_classes = int(round(np.sqrt(confusion_counts.size)))
+        confusion_counts = confusion_counts.reshape(numb_classes, numb_classes)
+    elif suffix == ".npz":
+        with np.load(path, allow_pickle=False) as arrays:
+            confusion_counts = arrays["counts"]
+            if "class_names" in arrays:
+                class_names = arrays["class_names"].tolist()
+            if "orders" in arrays:
+                orders = arrays["orders"].tolist()
+    elif suffix == ".npy":
+        mmap_mode = "r" if os.path.getsize(path) >= MMAP_MIN_BYTES else None
+        confusion_counts = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+        metadata_path = get_metadata_path(path)
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as metadata_file:
+                metadata = json.load(metadata_file)
+            class_names = metadata.get("class_names")
+            orders = metadata.get("orders")
+    else:
+        raise ValueError(f"Unsupported confusion matrix format: {suffix}")
+
+    if confusion_counts.ndim != 2 or confusion_counts.shape[0] != confusion_counts.shape[1]:
+        raise ValueError(f"Expect a square confusion matrix, got {confusion_counts.shape}.")
+    numb_classes = confusion_counts.shape[0]
+    if class_names is None:
+        class_names = get_default_class_names(numb_classes)
+    if orders is None:
+        orders = list(range(1, numb_classes + 1))
+    return confusion_counts, class_names, orders
+
+
+def save_confusion_matrix(
+    path: str, confusion_counts: np.ndarray, class_names: List[str], orders: List[int]
+) -> None:
+    """Save a confusion matrix in the format of the path suffix, see
+    load_confusion_matrix.
+
+    Args:
+        path (str): destination path
+        confusion_counts (np.ndarray): counts, indexed by [actual, predict]
+        class_names (List[str]): class names, aligned with the matrix axes
+        orders (List[int]): class orders, aligned with the matrix axes. CSV
+            files list the classes sorted by order instead, and require
+            distinct orders.
+    """
+    confusion_counts = np.asarray(confusion_counts)
+    class_names = [str(class_name) for class_name in class_names]
+    orders = [int(order) for order in orders]
+    suffix = get_suffix(path)
+    if suffix == ".csv":
+        import pandas as pd
+
+        # the layout only keeps the order of the classes, from the lowest to
+        # the highest, which cannot tell classes of the same order apart
+        if len(set(orders)) != len(orders):
+            raise ValueError("Classes sharing an order cannot be saved as CSV.")
+        sorted_indices = np.argsort(orders, kind="stable")
+        confusion_matrix = pd.DataFrame(
+            confusion_counts[np.ix_(sorted_indices, sorted_indices)],
+            index=[class_names[index] for index in sorted_indices],
+            columns=[class_names[index] for index in sorted_indices],
+        )
+        confusion_matrix.index.name = "actual\\predict"
+        confusion_matrix.to_csv(path)
+    elif suffix == ".parquet" or suffix in ARROW_SUFFIXES:
+        import pyarrow as pa
+
+        table = pa.table({"counts": confusion_counts.ravel()})
+        table = table.replace_schema_metadata(
+            {"class_names": json.dumps(class_names), "orders": json.dumps(orders)}
+        )
+        write_arrow_table(path, table)
+    elif suffix == ".npz":
+        np.savez(
+            path,
+            counts=confusion_counts,
+            class_names=np.asarray(class_names),
+            orders=np.asarray(orders),
+        )
+    elif suffix == ".npy":
+        np.save(path, confusion_counts)
+        with open(get_metadata_path(path), "w") as metadata_file:
+            json.dump({"class_names": class_names, "orders": orders}, metadata_file)
+    else:
+        raise ValueError(f"Unsupported confusion matrix format: {suffix}")
+
+
+def load_closeness_evaluation_measure_compute(
+    path: str,
+) -> ClosenessEvaluationMeasureCompute:
+    """Load a confusion matrix file, see load_confusion_matrix, into CEM compute."""
+    confusion_counts, class_names, orders = load_confusion_matrix(path)
+    return ClosenessEvaluationMeasureCompute(
+        confusion_matrix=confusion_counts, class_names=class_names, orders=orders
+    )
+
+
+def load_class_distribution(path: str) -> OrdinalClassDistribution:
+    """Load a class distribution.
+
+    Supported formats:
+        - .csv/.parquet/.arrow/.feather/.ipc: class_name, order and count columns
+        - .npz: "class_names", "orders" and "counts" arrays
+
+    Args:
+        path (str): path of the class distribution
+
+    Returns:
+        OrdinalClassDistribution: the class distribution
+    """
+    suffix = get_suffix(path)
+    if suffix == ".csv":
+        import pandas as pd
+
+        class_dist_df = pd.read_csv(path, encoding="utf-8-sig")
+        class_names = class_dist_df["class_name"].tolist()
+        orders = class_dist_df["order"].to_numpy()
+        counts = class_dist_df["count"].to_numpy()
+    elif suffix == ".parquet" or suffix in ARROW_SUFFIXES:
+        table = read_arrow_table(path)
+        class_names = table.column("class_name").to_pylist()
+        orders = column_to_numpy(table.column("order"))
+        counts = column_to_numpy(table.column("count"))
+    elif suffix == ".npz":
+        with np.load(path, allow_pickle=False) as arrays:
+            class_names = arrays["class_names"].tolist()
+            orders = arrays["orders"]
+            counts = arrays["counts"]
+    else:
+        raise ValueError(f"Unsupported class distribution format: {suffix}")
+    return OrdinalClassDistribution(class_names=class_names, orders=orders, counts=counts)
+
+
+def save_class_distribution(path: str, ordinal_dist: OrdinalClassDistribution) -> None:
+    """Save a class distribution in the format of the path suffix, see
+    load_class_distribution.
+
+    Args:
+        path (str): destination path
+        ordinal_dist (OrdinalClassDistribution): the class distribution
+    """
+    class_names = [str(class_name) for class_name in ordinal_dist.class_names]
+    suffix = get_suffix(path)
+    if suffix == ".csv":
+        import pandas as pd
+
+        pd.DataFrame(
+            {
+                "class_name": class_names,
+                "order": ordinal_dist.class_orders,
+                "count": ordinal_dist.counts,
+            }
+        ).to_csv(path, index=False)
+    elif suffix == ".parquet" or suffix in ARROW_SUFFIXES:
+        import pyarrow as pa
+
+        table = pa.table(
+            {
+                "class_name": class_names,
+                "order": ordinal_dist.class_orders,
+                "count": ordinal_dist.counts,
+            }
+        )
+        write_arrow_table(path, table)
+    elif suffix == ".npz":
+        np.savez(
+            path,
+            class_names=np.asarray(class_names),
+            orders=ordinal_dist.class_orders,
+            counts=ordinal_dist.counts,
+        )
+    else:
+        raise ValueError(f"Unsupported class distribution format: {suffix}")
+
+
+def open_label_column(path: str, dtype: Optional[np.dtype] = None) -> np.ndarray:
+    """Memory-map a binary column of class indices, without reading it.
+
+    Args:
+        path (str): a .npy file, or a raw binary file of dtype
+        dtype (np.dtype, optional): dtype of a raw binary file
+
+    Returns:
+        np.ndarray: read-only 1-D memory map
+    """
+    if get_suffix(path) == ".npy":
+        labels = np.load(path, mmap_mode="r", allow_pickle=False)
+    elif dtype is None:
+        raise ValueError("The dtype of a raw binary label file must be given.")
+    else:
+        labels = np.memmap(path, dtype=dtype, mode="r")
+    if labels.ndim != 1:
+        raise ValueError(f"Expect a 1-D label column, got shape {labels.shape}.")
+    return labels
+
+
+def iter_label_chunks(
+    true_path: str,
+    pred_path: str,
+    dtype: Optional[np.dtype] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield aligned (actual, predicted) chunks of two binary label columns,
+    reading at most chunk_size labels of each at a time.
+
+    Args:
+        true_path (str): actual class indices, see open_label_column
+        pred_path (str): predicted class indices, see open_label_column
+        dtype (np.dtype, optional): dtype of raw binary files
+        chunk_size (int): number of labels per chunk
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: actual and predicted class indices
+    """
+    true_labels = open_label_column(true_path, dtype)
+    pred_labels = open_label_column(pred_path, dtype)
+    if len(true_labels) != len(pred_labels):
+        raise ValueError("Actual and predicted label columns differ in length.")
+
+    for start in range(0, len(true_labels), chunk_size):
+        stop = start + chunk_size
+        yield np.asarray(true_labels[start:stop]), np.asarray(pred_labels[start:stop])
+
+
+def compute_cem_from_label_files(
+    true_path: str,
+    pred_path: str,
+    orders: List[int],
+    dtype: Optional[np.dtype] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> float:
+    """Compute CEM of prediction logs larger than memory, accumulating the
+    confusion matrix chunk by chunk, so memory is bounded by chunk_size + K^2.
+
+    Args:
+        true_path (str): actual class indices, see open_label_column
+        pred_path (str): predicted class indices, see open_label_column
+        orders (List[int]): class orders, indexed by class index
+        dtype (np.dtype, optional): dtype of raw binary files
+        chunk_size (int): number of labels per chunk
+
+    Returns:
+        float: CEM
+    """
+    accumulator = ClosenessEvaluationMeasureAccumulator(orders)
+    accumulator.consume(iter_label_chunks(true_path, pred_path, dtype, chunk_size))
+    return accumulator.get_proximity_between_two_dists()
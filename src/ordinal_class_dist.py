@@ -1,34 +1,128 @@
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+def compute_cumulative_counts(
+    orders: np.ndarray, counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Count, for each class, the samples whose order is strictly lower and
+    not higher than its own, through a prefix sum over the classes sorted by
+    order.
+
+    Args:
+        orders (np.ndarray): class orders
+        counts (np.ndarray): class counts, aligned with orders. Leading
+            dimensions, if any, index a batch of distributions.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: counts below and up to each class
+    """
+    orders = np.asarray(orders)
+    counts = np.asarray(counts)
+    sorted_indices = np.argsort(orders, kind="stable")
+    sorted_orders = orders[sorted_indices]
+    cumulative_counts = np.zeros(
+        counts.shape[:-1] + (len(orders) + 1,), dtype=counts.dtype
+    )
+    np.cumsum(counts[..., sorted_indices], axis=-1, out=cumulative_counts[..., 1:])
+    count_below = cumulative_counts[..., np.searchsorted(sorted_orders, orders, "left")]
+    count_upto = cumulative_counts[..., np.searchsorted(sorted_orders, orders, "right")]
+    return count_below, count_upto
+
 
 class OrdinalClassDistribution:
     """A class to encapsulate the distribution of classes in an ordinal classification.
 
+    Classes are held in contiguous arrays along with a prefix sum of their
+    counts over the order, so that count, in-between count and total count
+    queries take O(1).
+
     Args:
         class_names: List of class names
         orders: List of class orders
         counts: List of class counts
     Attributes:
         class_names: List of class names
-        orders: List of class orders
-        counts: List of class counts
-        class_order_mapping: Mapping from class name to order
-        order_class_mapping: Mapping from order to class name
-        class_frequency_mapping: Mapping from class name to frequency
+        class_orders: Array of class orders, aligned with class names
+        counts: Array of class counts, aligned with class names
+        orders: Array of class orders, sorted
+        class_index_mapping: Mapping from class name to its index
+        total_count: Total count of samples
 
     """
+
+    __slots__ = (
+        "class_names",
+        "class_orders",
+        "counts",
+        "orders",
+        "class_index_mapping",
+        "total_count",
+        "_sorted_indices",
+        "_cumulative_counts",
+        "_count_below",
+        "_count_upto",
+        "_class_order_mapping",
+        "_order_class_mapping",
+        "_class_frequency_mapping",
+    )
+
     def __init__(self, class_names: List, orders: List, counts: List) -> None:
-        self.class_names = class_names
-        self.orders = sorted(orders)
-        self.counts = counts
-        self.class_order_mapping = dict(zip(class_names, orders))
-        self.order_class_mapping = dict(zip(orders, class_names))
-        self.class_frequency_mapping = dict(zip(class_names, counts))
+        self.class_names = list(class_names)
+        self.class_orders = np.asarray(orders)
+        self.counts = np.asarray(counts)
+        self.class_index_mapping = {
+            class_name: index for index, class_name in enumerate(self.class_names)
+        }
+        self.total_count = self.counts.sum().item()
+
+        self._sorted_indices = np.argsort(self.class_orders, kind="stable")
+        self.orders = self.class_orders[self._sorted_indices]
+        self._cumulative_counts = np.concatenate(
+            ([0], np.cumsum(self.counts[self._sorted_indices]))
+        )
+        # same prefix sum as compute_cumulative_counts, without sorting twice
+        self._count_below = self._cumulative_counts[
+            np.searchsorted(self.orders, self.class_orders, "left")
+        ]
+        self._count_upto = self._cumulative_counts[
+            np.searchsorted(self.orders, self.class_orders, "right")
+        ]
+        # built on first access, most evaluations never use them
+        self._class_order_mapping = None
+        self._order_class_mapping = None
+        self._class_frequency_mapping = None
+
+    @property
+    def class_order_mapping(self) -> Dict:
+        if self._class_order_mapping is None:
+            self._class_order_mapping = dict(zip(self.class_names, self.class_orders.tolist()))
+        return self._class_order_mapping
+
+    @property
+    def order_class_mapping(self) -> Dict:
+        if self._order_class_mapping is None:
+            self._order_class_mapping = dict(zip(self.class_orders.tolist(), self.class_names))
+        return self._order_class_mapping
+
+    @property
+    def class_frequency_mapping(self) -> Dict:
+        if self._class_frequency_mapping is None:
+            self._class_frequency_mapping = dict(zip(self.class_names, self.counts.tolist()))
+        return self._class_frequency_mapping
+
+    def get_class_order(self, class_name: str) -> int:
+        index = self.class_index_mapping.get(class_name)
+        return 0 if index is None else self.class_orders[index].item()
 
     def get_class_count(self, class_name: str) -> int:
-        return self.class_frequency_mapping.get(class_name, 0)
-    
+        index = self.class_index_mapping.get(class_name)
+        return 0 if index is None else self.counts[index].item()
+
     def get_sample_count_between_two_classes(self, first_class: str, second_class: str) -> int:
-        """Get the sample count between two classes.
+        """Get the sample count between two classes, i.e. of the classes whose
+        order is strictly between theirs. Classes sharing an order are all
+        counted, once each.
 
         Args:
             first_class (str): a class name
@@ -38,15 +132,11 @@ class OrdinalClassDistribution:
             int: count of sample between two classes
         """
         lower_class, higher_class = self.sort_two_classes_by_order(first_class, second_class)
-        in_between_classes = self.get_class_names_in_between(lower_class, higher_class)
+        sample_count = self._get_count_below(higher_class) - self._get_count_upto(lower_class)
+        return max(sample_count, 0)
 
-        sample_count = 0
-        for class_name in in_between_classes:
-            sample_count += self.get_class_count(class_name)
-        return sample_count
-    
     def get_total_count(self) -> int:
-        return sum(self.counts)
+        return self.total_count
 
     def sort_two_classes_by_order(self, first_class: str, second_class: str) -> Tuple[str, str]:
         """Given two classes, return them in sorted order.
@@ -58,15 +148,16 @@ class OrdinalClassDistribution:
         Returns:
             Tuple[str, str]: sorted class names
         """
-        first_class_order = self.class_order_mapping.get(first_class, 0)
-        second_class_order = self.class_order_mapping.get(second_class, 0)
+        first_class_order = self.get_class_order(first_class)
+        second_class_order = self.get_class_order(second_class)
         if first_class_order < second_class_order:
             return first_class, second_class
         else:
             return second_class, first_class
 
     def get_class_names_in_between(self, lower_class: str, higher_class: str) -> List[str]:
-        """Given two classes, return all class names in between (exclusively).
+        """Given two classes, return all class names in between (exclusively),
+        including every class of a shared order, sorted by order.
 
         Args:
             lower_class (str): a class name
@@ -75,10 +166,19 @@ class OrdinalClassDistribution:
         Returns:
             List[str]: list of class names in between
         """
-        lower_class_order = self.class_order_mapping.get(lower_class, 0)
-        higher_class_order = self.class_order_mapping.get(higher_class, 0)
-        in_between_class_names = list()
-        for order in self.orders:
-            if (lower_class_order < order < higher_class_order):
-                in_between_class_names.append(self.order_class_mapping[order])
-        return in_between_class_names
\ No newline at end of file
+        start = np.searchsorted(self.orders, self.get_class_order(lower_class), "right")
+        end = np.searchsorted(self.orders, self.get_class_order(higher_class), "left")
+        return [self.class_names[index] for index in self._sorted_indices[start:end]]
+
+    def _get_count_below(self, class_name: str) -> int:
+        index = self.class_index_mapping.get(class_name)
+        if index is None:
+            # unknown classes have order 0
+            return self._cumulative_counts[np.searchsorted(self.orders, 0, "left")].item()
+        return self._count_below[index].item()
+
+    def _get_count_upto(self, class_name: str) -> int:
+        index = self.class_index_mapping.get(class_name)
+        if index is None:
+            return self._cumulative_counts[np.searchsorted(self.orders, 0, "right")].item()
+        return self._count_upto[index].item()
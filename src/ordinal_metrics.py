@@ -0,0 +1,111 @@
+from typing import List, NamedTuple, Optional
+import numpy as np
+
+from src.CEM import compute_cem_from_confusion_counts, compute_confusion_counts
+from src.ordinal_class_dist import compute_cumulative_counts
+from src.utils import compute_accuracy_score
+
+
+class OrdinalMetrics(NamedTuple):
+    accuracy: float
+    mae: float
+    macro_mae: float
+    quadratic_weighted_kappa: float
+    spearman: float
+    cem: float
+
+
+def compute_ordinal_metrics(
+    confusion_counts: np.ndarray, orders: List[int]
+) -> OrdinalMetrics:
+    """Compute the usual ordinal classification metrics from one confusion
+    matrix, each as a reduction over the K x K counts.
+
+    Errors are measured as distances between class orders, and Spearman
+    correlation ranks tied samples, i.e. samples of the same class, at their
+    average rank.
+
+    Args:
+        confusion_counts (np.ndarray): counts, indexed by [actual, predict]
+        orders (List[int]): class orders
+
+    Returns:
+        OrdinalMetrics: accuracy, MAE, macro-averaged MAE over the actual
+            classes, quadratic weighted kappa, Spearman correlation and CEM
+    """
+    confusion_counts = np.asarray(confusion_counts)
+    orders = np.asarray(orders, dtype=np.float64)
+    actual_counts = confusion_counts.sum(axis=1)
+    predict_counts = confusion_counts.sum(axis=0)
+    total_count = actual_counts.sum()
+
+    distances = np.abs(np.subtract.outer(orders, orders))
+    absolute_errors = np.sum(confusion_counts * distances, axis=1)
+    observed = actual_counts > 0
+    mae = absolute_errors.sum() / total_count
+    macro_mae = np.mean(absolute_errors[observed] / actual_counts[observed])
+
+    # kappa compares the squared errors with those of independent predictions
+    squared_distances = distances**2
+    expected_counts = np.outer(actual_counts, predict_counts) / total_count
+    squared_errors = np.sum(confusion_counts * squared_distances)
+    expected_squared_errors = np.sum(expected_counts * squared_distances)
+    quadratic_weighted_kappa = 1 - squared_errors / expected_squared_errors
+
+    mean_rank = (total_count + 1) / 2
+    actual_ranks = compute_average_ranks(orders, actual_counts) - mean_rank
+    predict_ranks = compute_average_ranks(orders, predict_counts) - mean_rank
+    covariance = actual_ranks @ confusion_counts @ predict_ranks
+    spearman = covariance / np.sqrt(
+        np.dot(actual_counts, actual_ranks**2) * np.dot(predict_counts, predict_ranks**2)
+    )
+
+    return OrdinalMetrics(
+        accuracy=float(compute_accuracy_score(confusion_counts)),
+        mae=float(mae),
+        macro_mae=float(macro_mae),
+        quadratic_weighted_kappa=float(quadratic_weighted_kappa),
+        spearman=float(spearman),
+        cem=compute_cem_from_confusion_counts(confusion_counts, orders),
+    )
+
+
+def compute_ordinal_metrics_from_labels(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+) -> OrdinalMetrics:
+    """Compute the usual ordinal classification metrics from actual and
+    predicted labels, counted once into a confusion matrix.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+
+    Returns:
+        OrdinalMetrics: accuracy, MAE, macro-averaged MAE, quadratic weighted
+            kappa, Spearman correlation and CEM
+    """
+    confusion_counts = compute_confusion_counts(
+        y_true, y_pred, numb_classes=len(orders), class_names=class_names
+    )
+    return compute_ordinal_metrics(confusion_counts, orders)
+
+
+def compute_average_ranks(orders: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Rank the samples of each class, from 1 for the lowest order, giving
+    tied samples their average rank.
+
+    Args:
+        orders (np.ndarray): class orders
+        counts (np.ndarray): class counts, aligned with orders
+
+    Returns:
+        np.ndarray: rank of the samples of each class
+    """
+    count_below, count_upto = compute_cumulative_counts(orders, counts)
+    return (count_below + count_upto + 1) / 2
@@ -0,0 +1,457 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple, Union
+import numpy as np
+
+from src.CEM import (
+    check_class_indices,
+    compute_cem_from_confusion_counts,
+    compute_cem_from_proximity_matrix,
+    compute_confusion_counts,
+    compute_proximity_matrix,
+    encode_labels,
+    get_cached_proximity_matrix,
+)
+
+RandomState = Optional[Union[int, np.random.SeedSequence]]
+# elements of the largest array of a batch, lowering batch sizes on large inputs
+BATCH_ELEMENT_BUDGET = 2**22
+# groups of up to this many items swap their items one by one from random
+# bits, larger groups draw their number of swaps from a binomial
+MAX_ITEM_SWAP_GROUP_SIZE = 16
+# a multinomial draw costs about as much per group as resampling this many items
+MULTINOMIAL_GROUP_COST = 3
+
+
+class ConfidenceInterval(NamedTuple):
+    estimate: float
+    low: float
+    high: float
+
+
+class SignificanceTestResult(NamedTuple):
+    statistic: float
+    p_value: float
+
+
+def split_into_batches(n_resamples: int, batch_size: int) -> List[int]:
+    numb_full_batches, remainder = divmod(n_resamples, batch_size)
+    batch_sizes = [batch_size] * numb_full_batches
+    if remainder:
+        batch_sizes.append(remainder)
+    return batch_sizes
+
+
+def get_batch_size(batch_size: int, numb_elements: int) -> int:
+    """Lower batch_size so that a batch of items of numb_elements each stays
+    within BATCH_ELEMENT_BUDGET elements."""
+    return max(1, min(batch_size, BATCH_ELEMENT_BUDGET // max(numb_elements, 1)))
+
+
+def map_batches(func, batch_args: List[tuple], n_jobs: int = 1) -> List:
+    """Apply func to every batch of arguments, optionally over a process pool.
+
+    Args:
+        func: a picklable (module-level) function
+        batch_args (List[tuple]): arguments of each batch
+        n_jobs (int): number of worker processes, 1 to run in-process
+
+    Returns:
+        List: results, in the same order as batch_args
+    """
+    if n_jobs == 1 or len(batch_args) <= 1:
+        return [func(*args) for args in batch_args]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(func, *zip(*batch_args)))
+
+
+def resample_cem(
+    confusion_counts: np.ndarray,
+    orders: List[int],
+    n_resamples: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """Score multinomial resamples of a confusion matrix in one vectorized batch.
+
+    Each resample draws as many samples as the confusion matrix holds, so the
+    actual class distribution, hence the proximity matrix, varies per resample.
+
+    Args:
+        confusion_counts (np.ndarray): counts, indexed by [actual, predict]
+        orders (List[int]): class orders, aligned with the matrix axes
+        n_resamples (int): number of resamples
+        seed (np.random.SeedSequence): seed of this batch
+
+    Returns:
+        np.ndarray: CEM of each resample
+    """
+    rng = np.random.default_rng(seed)
+    confusion_counts = np.asarray(confusion_counts)
+    total_count = int(confusion_counts.sum())
+    cell_probabilities = confusion_counts.ravel() / total_count
+    resampled_counts = rng.multinomial(
+        total_count, cell_probabilities, size=n_resamples
+    ).reshape((n_resamples,) + confusion_counts.shape)
+
+    proximity_matrices = compute_proximity_matrix(
+        orders, resampled_counts.sum(axis=-1)
+    )
+    return compute_cem_from_proximity_matrix(resampled_counts, proximity_matrices)
+
+
+def bootstrap_cem(
+    confusion_counts: np.ndarray,
+    orders: List[int],
+    n_resamples: int = 10000,
+    confidence_level: float = 0.95,
+    batch_size: int = 1000,
+    n_jobs: int = 1,
+    random_state: RandomState = None,
+) -> ConfidenceInterval:
+    """Estimate a percentile bootstrap confidence interval of CEM.
+
+    Resamples are evaluated in vectorized batches, each batch being seeded
+    from random_state independently of n_jobs, so results are reproducible
+    whether they are computed in one process or many.
+
+    Args:
+        confusion_counts (np.ndarray): counts, indexed by [actual, predict]
+        orders (List[int]): class orders, aligned with the matrix axes
+        n_resamples (int): number of bootstrap resamples
+        confidence_level (float): confidence level of the interval
+        batch_size (int): number of resamples evaluated at once, lowered so
+            that batch_size x K x K stays within BATCH_ELEMENT_BUDGET
+        n_jobs (int): number of worker processes
+        random_state (RandomState): seed of the resampling
+
+    Returns:
+        ConfidenceInterval: CEM of the confusion matrix and interval bounds
+    """
+    if not 0 < confidence_level < 1:
+        raise ValueError("Confidence level must be in (0, 1).")
+    confusion_counts = np.asarray(confusion_counts)
+    batch_size = get_batch_size(batch_size, confusion_counts.size)
+    batch_sizes = split_into_batches(n_resamples, batch_size)
+    seeds = np.random.SeedSequence(random_state).spawn(len(batch_sizes))
+    resampled_cems = map_batches(
+        resample_cem,
+        [
+            (confusion_counts, orders, numb_resamples, seed)
+            for numb_resamples, seed in zip(batch_sizes, seeds)
+        ],
+        n_jobs=n_jobs,
+    )
+    resampled_cems = np.concatenate(resampled_cems)
+
+    alpha = 1 - confidence_level
+    low, high = np.percentile(resampled_cems, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return ConfidenceInterval(
+        estimate=compute_cem_from_confusion_counts(confusion_counts, orders),
+        low=float(low),
+        high=float(high),
+    )
+
+
+def bootstrap_cem_from_labels(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+    **kwargs,
+) -> ConfidenceInterval:
+    """Estimate a bootstrap confidence interval of CEM from label pairs.
+
+    Resampling label pairs with replacement is a multinomial draw over the
+    cells of their confusion matrix, hence the pairs are counted once and
+    resampled through bootstrap_cem.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred (np.ndarray): predicted labels
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+        **kwargs: keyword arguments of bootstrap_cem
+
+    Returns:
+        ConfidenceInterval: CEM of the labels and interval bounds
+    """
+    confusion_counts = compute_confusion_counts(
+        y_true, y_pred, numb_classes=len(orders), class_names=class_names
+    )
+    return bootstrap_cem(confusion_counts, orders, **kwargs)
+
+
+def compute_paired_contributions(
+    y_true: np.ndarray,
+    y_pred_a: np.ndarray,
+    y_pred_b: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Gather the CEM contributions of two systems' predictions on the same items.
+
+    Items are grouped by their (actual, predict A, predict B) classes, which
+    share the same contributions, so resampling costs scale with the number
+    of distinct groups (at most K^3) instead of the number of items.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred_a (np.ndarray): labels predicted by system A
+        y_pred_b (np.ndarray): labels predicted by system B
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: per group, the
+            item count, numerator of A, numerator of B and shared denominator
+    """
+    numb_classes = len(orders)
+    actual_indices = encode_labels(y_true, class_names).astype(np.int64)
+    predict_a_indices = encode_labels(y_pred_a, class_names)
+    predict_b_indices = encode_labels(y_pred_b, class_names)
+    if not actual_indices.shape == predict_a_indices.shape == predict_b_indices.shape:
+        raise ValueError("Actual and predicted labels must have the same shape.")
+    for indices in (actual_indices, predict_a_indices, predict_b_indices):
+        check_class_indices(indices, numb_classes)
+
+    # a single lookup table for the shared actual class distribution
+    proximity_matrix = get_cached_proximity_matrix(
+        orders, np.bincount(actual_indices, minlength=numb_classes)
+    )
+    group_keys = (actual_indices * numb_classes + predict_a_indices) * numb_classes
+    group_keys += predict_b_indices
+    group_keys, item_counts = np.unique(group_keys, return_counts=True)
+    actual_indices, predict_indices = np.divmod(group_keys, numb_classes**2)
+    predict_a_indices, predict_b_indices = np.divmod(predict_indices, numb_classes)
+
+    return (
+        item_counts,
+        proximity_matrix[predict_a_indices, actual_indices],
+        proximity_matrix[predict_b_indices, actual_indices],
+        proximity_matrix[actual_indices, actual_indices],
+    )
+
+
+def split_paired_differences(
+    item_counts: np.ndarray, differences: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split groups into items to swap one by one and groups large enough to
+    draw their number of swaps at once, dropping groups whose swaps cannot
+    change the difference.
+
+    Args:
+        item_counts (np.ndarray): item count of each group
+        differences (np.ndarray): numerator difference of each group
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: difference of each item of
+            the small groups, then item count and difference of the others
+    """
+    is_swappable = differences != 0
+    is_small = is_swappable & (item_counts <= MAX_ITEM_SWAP_GROUP_SIZE)
+    is_large = is_swappable & ~is_small
+    return (
+        np.repeat(differences[is_small], item_counts[is_small]),
+        item_counts[is_large],
+        differences[is_large],
+    )
+
+
+def permute_paired_differences(
+    item_differences: np.ndarray,
+    group_counts: np.ndarray,
+    group_differences: np.ndarray,
+    n_permutations: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """Sum of numerator differences under random swaps of the two systems'
+    predictions, for a batch of permutations.
+
+    Swapping an item with probability 1/2 flips the sign of its difference.
+    Items of small groups are swapped by random bits, 8 per random byte, and
+    each large group of m items flips a Binomial(m, 1/2) number of them.
+    """
+    rng = np.random.default_rng(seed)
+    permuted_differences = np.zeros(n_permutations)
+    numb_items = len(item_differences)
+    if numb_items:
+        random_bytes = rng.integers(
+            0, 256, size=(n_permutations, -(-numb_items // 8)), dtype=np.uint8
+        )
+        is_swapped = np.unpackbits(random_bytes, axis=1, count=numb_items)
+        permuted_differences += item_differences.sum()
+        permuted_differences -= 2 * (is_swapped.astype(np.float64) @ item_differences)
+    if len(group_counts):
+        numb_swapped = rng.binomial(
+            group_counts, 0.5, size=(n_permutations, len(group_counts))
+        )
+        permuted_differences += (group_counts - 2 * numb_swapped) @ group_differences
+    return permuted_differences
+
+
+def resample_paired_differences(
+    item_counts: np.ndarray,
+    numerators_a: np.ndarray,
+    numerators_b: np.ndarray,
+    denominators: np.ndarray,
+    n_resamples: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """CEM difference of the two systems over a batch of paired item resamples.
+
+    Resamples draw a multinomial over the groups, or item indices when groups
+    are so many that the multinomial would cost more.
+    """
+    rng = np.random.default_rng(seed)
+    total_count = int(item_counts.sum())
+    if is_item_resampling(item_counts):
+        group_indices = np.repeat(np.arange(len(item_counts)), item_counts)
+        resampled_indices = group_indices[
+            rng.integers(0, total_count, size=(n_resamples, total_count))
+        ]
+        return (
+            np.take(numerators_a - numerators_b, resampled_indices).sum(axis=1)
+            / np.take(denominators, resampled_indices).sum(axis=1)
+        )
+
+    resampled_counts = rng.multinomial(
+        total_count, item_counts / total_count, size=n_resamples
+    )
+    return (
+        resampled_counts @ numerators_a - resampled_counts @ numerators_b
+    ) / (resampled_counts @ denominators)
+
+
+def is_item_resampling(item_counts: np.ndarray) -> bool:
+    """Whether resampling item indices is cheaper than a multinomial over the
+    groups of item_counts."""
+    return item_counts.sum() < MULTINOMIAL_GROUP_COST * len(item_counts)
+
+
+def paired_permutation_test(
+    y_true: np.ndarray,
+    y_pred_a: np.ndarray,
+    y_pred_b: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+    n_permutations: int = 10000,
+    batch_size: int = 1000,
+    n_jobs: int = 1,
+    random_state: RandomState = None,
+) -> SignificanceTestResult:
+    """Two-sided approximate randomization test of the CEM difference between
+    two systems evaluated on the same items.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred_a (np.ndarray): labels predicted by system A
+        y_pred_b (np.ndarray): labels predicted by system B
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+        n_permutations (int): number of random permutations
+        batch_size (int): number of permutations evaluated at once, lowered
+            to stay within BATCH_ELEMENT_BUDGET elements
+        n_jobs (int): number of worker processes
+        random_state (RandomState): seed of the permutations
+
+    Returns:
+        SignificanceTestResult: CEM of A minus CEM of B, and its p-value
+    """
+    item_counts, numerators_a, numerators_b, denominators = (
+        compute_paired_contributions(y_true, y_pred_a, y_pred_b, orders, class_names)
+    )
+    # the denominator is shared by both systems, hence left out of permutations
+    sum_denominator = item_counts @ denominators
+    differences = numerators_a - numerators_b
+    observed_difference = item_counts @ differences
+    split_differences = split_paired_differences(item_counts, differences)
+    item_differences, group_counts, _ = split_differences
+
+    batch_size = get_batch_size(batch_size, len(item_differences) + len(group_counts))
+    batch_sizes = split_into_batches(n_permutations, batch_size)
+    seeds = np.random.SeedSequence(random_state).spawn(len(batch_sizes))
+    permuted_differences = map_batches(
+        permute_paired_differences,
+        [
+            split_differences + (numb_permutations, seed)
+            for numb_permutations, seed in zip(batch_sizes, seeds)
+        ],
+        n_jobs=n_jobs,
+    )
+    permuted_differences = np.concatenate(permuted_differences)
+
+    tolerance = 1e-12 * max(abs(observed_difference), 1)
+    numb_extremes = np.sum(
+        np.abs(permuted_differences) >= abs(observed_difference) - tolerance
+    )
+    return SignificanceTestResult(
+        statistic=float(observed_difference / sum_denominator),
+        p_value=float((numb_extremes + 1) / (n_permutations + 1)),
+    )
+
+
+def paired_bootstrap_test(
+    y_true: np.ndarray,
+    y_pred_a: np.ndarray,
+    y_pred_b: np.ndarray,
+    orders: List[int],
+    class_names: Optional[List] = None,
+    n_resamples: int = 10000,
+    batch_size: int = 1000,
+    n_jobs: int = 1,
+    random_state: RandomState = None,
+) -> SignificanceTestResult:
+    """Two-sided paired bootstrap test of the CEM difference between two
+    systems evaluated on the same items.
+
+    Items are resampled with replacement while their contributions stay
+    those of the full test set. The p-value is the share of resampled
+    differences, shifted to a null mean, at least as extreme as the observed one.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        y_pred_a (np.ndarray): labels predicted by system A
+        y_pred_b (np.ndarray): labels predicted by system B
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels must be class indices into orders.
+        n_resamples (int): number of bootstrap resamples
+        batch_size (int): number of resamples evaluated at once, lowered to
+            stay within BATCH_ELEMENT_BUDGET elements
+        n_jobs (int): number of worker processes
+        random_state (RandomState): seed of the resampling
+
+    Returns:
+        SignificanceTestResult: CEM of A minus CEM of B, and its p-value
+    """
+    contributions = compute_paired_contributions(
+        y_true, y_pred_a, y_pred_b, orders, class_names
+    )
+    item_counts, numerators_a, numerators_b, denominators = contributions
+    observed_difference = (
+        item_counts @ numerators_a - item_counts @ numerators_b
+    ) / (item_counts @ denominators)
+
+    numb_elements = item_counts.sum() if is_item_resampling(item_counts) else len(item_counts)
+    batch_size = get_batch_size(batch_size, numb_elements)
+    batch_sizes = split_into_batches(n_resamples, batch_size)
+    seeds = np.random.SeedSequence(random_state).spawn(len(batch_sizes))
+    resampled_differences = map_batches(
+        resample_paired_differences,
+        [
+            contributions + (numb_resamples, seed)
+            for numb_resamples, seed in zip(batch_sizes, seeds)
+        ],
+        n_jobs=n_jobs,
+    )
+    resampled_differences = np.concatenate(resampled_differences)
+
+    numb_extremes = np.sum(
+        np.abs(resampled_differences - observed_difference) >= abs(observed_difference)
+    )
+    return SignificanceTestResult(
+        statistic=float(observed_difference),
+        p_value=float((numb_extremes + 1) / (n_resamples + 1)),
+    )
@@ -0,0 +1,378 @@
+from typing import Any, Iterable, List, Optional, Tuple
+import numpy as np
+
+from src.CEM import (
+    compute_cem_from_proximity_matrix,
+    compute_cem_from_sparse_counts,
+    compute_confusion_counts,
+    compute_proximity_matrix,
+    encode_label_pairs,
+)
+from src.ordinal_class_dist import OrdinalClassDistribution
+
+
+class ClosenessEvaluationMeasureAccumulator:
+    """Accumulate the confusion matrix of streamed predictions, so that CEM
+    can be reported at any time without buffering the predictions.
+
+    Args:
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels are class indices into orders.
+    Attributes:
+        orders: List of class orders
+        class_names: List of class names, or None
+        confusion_counts: running counts, indexed by [actual, predict]
+        actual_counts: running count of each actual class
+
+    """
+
+    def __init__(self, orders: List[int], class_names: Optional[List] = None) -> None:
+        self.orders = list(orders)
+        self.class_names = None if class_names is None else list(class_names)
+        numb_classes = len(self.orders)
+        self.confusion_counts = np.zeros((numb_classes, numb_classes), dtype=np.int64)
+        self.actual_counts = np.zeros(numb_classes, dtype=np.int64)
+
+    def update(
+        self, y_true: np.ndarray, y_pred: np.ndarray
+    ) -> "ClosenessEvaluationMeasureAccumulator":
+        """Add a batch of actual and predicted labels.
+
+        Args:
+            y_true (np.ndarray): actual labels
+            y_pred (np.ndarray): predicted labels
+
+        Returns:
+            ClosenessEvaluationMeasureAccumulator: the accumulator itself
+        """
+        confusion_counts = compute_confusion_counts(
+            y_true, y_pred, numb_classes=len(self.orders), class_names=self.class_names
+        )
+        return self.update_confusion_counts(confusion_counts)
+
+    def update_confusion_counts(
+        self, confusion_counts: np.ndarray
+    ) -> "ClosenessEvaluationMeasureAccumulator":
+        """Add a partial confusion matrix.
+
+        Args:
+            confusion_counts (np.ndarray): counts, indexed by [actual, predict]
+
+        Returns:
+            ClosenessEvaluationMeasureAccumulator: the accumulator itself
+        """
+        confusion_counts = np.asarray(confusion_counts)
+        if confusion_counts.shape != self.confusion_counts.shape:
+            raise ValueError(
+                f"Expect a confusion matrix of shape {self.confusion_counts.shape}, "
+                f"got {confusion_counts.shape}."
+            )
+        self.confusion_counts += confusion_counts
+        self.actual_counts += confusion_counts.sum(axis=1)
+        return self
+
+    def consume(
+        self, batches: Iterable[Tuple[np.ndarray, np.ndarray]]
+    ) -> "ClosenessEvaluationMeasureAccumulator":
+        """Add every (actual labels, predicted labels) batch of an iterable,
+        e.g. a generator over inference outputs.
+
+        Args:
+            batches (Iterable[Tuple[np.ndarray, np.ndarray]]): label batches
+
+        Returns:
+            ClosenessEvaluationMeasureAccumulator: the accumulator itself
+        """
+        for y_true, y_pred in batches:
+            self.update(y_true, y_pred)
+        return self
+
+    def merge(
+        self, other: "ClosenessEvaluationMeasureAccumulator"
+    ) -> "ClosenessEvaluationMeasureAccumulator":
+        """Merge the counts of another accumulator into this one.
+
+        Args:
+            other (ClosenessEvaluationMeasureAccumulator): an accumulator over
+                the same classes
+
+        Returns:
+            ClosenessEvaluationMeasureAccumulator: the accumulator itself
+        """
+        if other.orders != self.orders or other.class_names != self.class_names:
+            raise ValueError("Only accumulators over the same classes can be merged.")
+        return self.update_confusion_counts(other.confusion_counts)
+
+    def reset(self) -> None:
+        self.confusion_counts[:] = 0
+        self.actual_counts[:] = 0
+
+    def get_total_count(self) -> int:
+        return int(self.actual_counts.sum())
+
+    def get_actual_ordinal_dist(self) -> OrdinalClassDistribution:
+        class_names = self.class_names
+        if class_names is None:
+            class_names = list(range(len(self.orders)))
+        return OrdinalClassDistribution(
+            class_names=class_names,
+            orders=self.orders,
+            counts=self.actual_counts.tolist(),
+        )
+
+    def get_proximity_between_two_dists(self) -> float:
+        """Calculate CEM over all predictions accumulated so far, in O(K^2).
+
+        Returns:
+            float: The proximity between the two distributions.
+        """
+        proximity_matrix = compute_proximity_matrix(self.orders, self.actual_counts)
+        return compute_cem_from_proximity_matrix(
+            self.confusion_counts, proximity_matrix
+        )
+
+
+class ClosenessEvaluationMeasureMonitor:
+    """Report CEM over the latest predictions of a live classifier, either the
+    last window_size of them, or all of them weighted by an exponential decay
+    of their age.
+
+    Counts are updated in place per event: a sliding window keeps its events
+    in a ring buffer to evict the oldest one, and a decay weighs each new
+    event 2 ** (time / half_life), rescaling the counts once in a while
+    rather than decaying them all per event, since CEM only depends on
+    relative counts. The proximity matrix of the actual distribution is only
+    recomputed when CEM is queried after a change.
+
+    Args:
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels are class indices into orders.
+        window_size (int, optional): number of latest events to evaluate
+        half_life (float, optional): age at which an event weighs half of a
+            new one, in events, or in timestamp units if timestamps are given
+    Attributes:
+        orders: List of class orders
+        class_names: List of class names, or None
+        window_size: number of latest events to evaluate, or None
+        half_life: half-life of the event weights, or None
+        confusion_counts: counts, or weights if decayed, indexed by
+            [actual, predict]
+        actual_counts: count, or weight if decayed, of each actual class
+
+    """
+
+    # rescale decayed weights before 2 ** exponent gets close to overflow
+    MAX_DECAY_EXPONENT = 512
+
+    def __init__(
+        self,
+        orders: List[int],
+        class_names: Optional[List] = None,
+        window_size: Optional[int] = None,
+        half_life: Optional[float] = None,
+    ) -> None:
+        if (window_size is None) == (half_life is None):
+            raise ValueError("Expect exactly one of window_size and half_life.")
+        if window_size is not None and window_size <= 0:
+            raise ValueError("Window size must be positive.")
+        if half_life is not None and half_life <= 0:
+            raise ValueError("Half-life must be positive.")
+
+        self.orders = list(orders)
+        self.class_names = None if class_names is None else list(class_names)
+        self.window_size = window_size
+        self.half_life = half_life
+        numb_classes = len(self.orders)
+        dtype = np.int64 if half_life is None else np.float64
+        self.confusion_counts = np.zeros((numb_classes, numb_classes), dtype=dtype)
+        self.actual_counts = np.zeros(numb_classes, dtype=dtype)
+
+        self._class_index_mapping = None
+        if self.class_names is not None:
+            self._class_index_mapping = {
+                class_name: index for index, class_name in enumerate(self.class_names)
+            }
+        if window_size is not None:
+            self._actual_buffer = np.zeros(window_size, dtype=np.int64)
+            self._predict_buffer = np.zeros(window_size, dtype=np.int64)
+        self._buffer_start = 0
+        self._buffer_count = 0
+        self._event_count = 0
+        self._reference_time = None
+        self._latest_time = None
+        self._proximity = None
+
+    def add(self, actual: Any, predict: Any, timestamp: Optional[float] = None) -> None:
+        """Add a single event.
+
+        Args:
+            actual (Any): actual label
+            predict (Any): predicted label
+            timestamp (float, optional): time of the event, for a decay.
+                Default to the number of events added so far.
+        """
+        actual_index = self._get_class_index(actual)
+        predict_index = self._get_class_index(predict)
+        if self.window_size is None:
+            time = self._event_count if timestamp is None else timestamp
+            weight = self._get_weights(np.array([time], dtype=np.float64))[0]
+        else:
+            weight = 1
+            buffer_index = (self._buffer_start + self._buffer_count) % self.window_size
+            if self._buffer_count == self.window_size:
+                # the new event takes the slot of the oldest one
+                oldest_actual_index = self._actual_buffer[buffer_index]
+                self.confusion_counts[
+                    oldest_actual_index, self._predict_buffer[buffer_index]
+                ] -= 1
+                self.actual_counts[oldest_actual_index] -= 1
+                self._buffer_start = (self._buffer_start + 1) % self.window_size
+                self._buffer_count -= 1
+            self._actual_buffer[buffer_index] = actual_index
+            self._predict_buffer[buffer_index] = predict_index
+            self._buffer_count += 1
+
+        self.confusion_counts[actual_index, predict_index] += weight
+        self.actual_counts[actual_index] += weight
+        self._event_count += 1
+        self._proximity = None
+
+    def update(
+        self,
+        y_true: np.ndarray,
+        y_pred: np.ndarray,
+        timestamps: Optional[np.ndarray] = None,
+    ) -> "ClosenessEvaluationMeasureMonitor":
+        """Add a batch of events, from the oldest to the newest.
+
+        Args:
+            y_true (np.ndarray): actual labels
+            y_pred (np.ndarray): predicted labels
+            timestamps (np.ndarray, optional): time of each event, for a decay.
+                Default to the number of events added before each one.
+
+        Returns:
+            ClosenessEvaluationMeasureMonitor: the monitor itself
+        """
+        numb_classes = len(self.orders)
+        actual_indices, predict_indices = encode_label_pairs(
+            y_true, y_pred, numb_classes, self.class_names
+        )
+        numb_events = len(actual_indices)
+        if numb_events == 0:
+            return self
+        if self.window_size is None:
+            if timestamps is None:
+                times = np.arange(self._event_count, self._event_count + numb_events)
+            else:
+                times = np.asarray(timestamps).ravel()
+                if len(times) != numb_events:
+                    raise ValueError("Timestamps and labels must have the same shape.")
+            weights = self._get_weights(times.astype(np.float64))
+        else:
+            # only the latest window_size events of the batch can stay
+            actual_indices = actual_indices[-self.window_size :]
+            predict_indices = predict_indices[-self.window_size :]
+            self._evict(
+                max(self._buffer_count + len(actual_indices) - self.window_size, 0)
+            )
+            buffer_indices = (
+                self._buffer_start + self._buffer_count + np.arange(len(actual_indices))
+            ) % self.window_size
+            self._actual_buffer[buffer_indices] = actual_indices
+            self._predict_buffer[buffer_indices] = predict_indices
+            self._buffer_count += len(actual_indices)
+            weights = None
+
+        cell_counts = np.bincount(
+            actual_indices * numb_classes + predict_indices,
+            weights=weights,
+            minlength=numb_classes**2,
+        ).reshape(numb_classes, numb_classes)
+        self.confusion_counts += cell_counts
+        self.actual_counts += cell_counts.sum(axis=1)
+        self._event_count += numb_events
+        self._proximity = None
+        return self
+
+    def reset(self) -> None:
+        self.confusion_counts[:] = 0
+        self.actual_counts[:] = 0
+        self._buffer_start = 0
+        self._buffer_count = 0
+        self._event_count = 0
+        self._reference_time = None
+        self._latest_time = None
+        self._proximity = None
+
+    def get_total_count(self) -> float:
+        """Get the number of events in the window, or their total weight
+        relative to a new event if decayed."""
+        if self.window_size is not None:
+            return self._buffer_count
+        if self._reference_time is None:
+            return 0.0
+        latest_exponent = (self._latest_time - self._reference_time) / self.half_life
+        return float(self.actual_counts.sum() * 2.0**-latest_exponent)
+
+    def get_proximity_between_two_dists(self) -> float:
+        """Calculate CEM over the monitored events, scoring the non-zero cells
+        only after a change, and in O(1) otherwise.
+
+        Returns:
+            float: The proximity between the two distributions.
+        """
+        if self._proximity is None:
+            actual_indices, predict_indices = np.nonzero(self.confusion_counts)
+            self._proximity = compute_cem_from_sparse_counts(
+                (
+                    actual_indices,
+                    predict_indices,
+                    self.confusion_counts[actual_indices, predict_indices],
+                ),
+                self.orders,
+            )
+        return self._proximity
+
+    def _get_class_index(self, label: Any) -> int:
+        if self._class_index_mapping is None:
+            index = int(label)
+        else:
+            index = self._class_index_mapping.get(label, -1)
+        if not 0 <= index < len(self.orders):
+            raise ValueError(f"Unknown class: {label}")
+        return index
+
+    def _evict(self, numb_events: int) -> None:
+        """Remove the numb_events oldest events of the window."""
+        if numb_events == 0:
+            return
+        numb_classes = len(self.orders)
+        buffer_indices = (self._buffer_start + np.arange(numb_events)) % self.window_size
+        actual_indices = self._actual_buffer[buffer_indices]
+        cell_counts = np.bincount(
+            actual_indices * numb_classes + self._predict_buffer[buffer_indices],
+            minlength=numb_classes**2,
+        ).reshape(numb_classes, numb_classes)
+        self.confusion_counts -= cell_counts
+        self.actual_counts -= cell_counts.sum(axis=1)
+        self._buffer_start = (self._buffer_start + numb_events) % self.window_size
+        self._buffer_count -= numb_events
+
+    def _get_weights(self, times: np.ndarray) -> np.ndarray:
+        """Weigh events by 2 ** (time / half_life), relative to a reference
+        time which moves forward, rescaling the counts, to avoid overflows."""
+        if self._reference_time is None:
+            self._reference_time = self._latest_time = times.min()
+        self._latest_time = max(self._latest_time, times.max())
+        exponents = (times - self._reference_time) / self.half_life
+        max_exponent = exponents.max()
+        if max_exponent > self.MAX_DECAY_EXPONENT:
+            rescale = 2.0 ** -max_exponent
+            self.confusion_counts *= rescale
+            self.actual_counts *= rescale
+            self._reference_time += max_exponent * self.half_life
+            exponents -= max_exponent
+        return 2.0**exponents
@@ -0,0 +1,130 @@
+from typing import List, Optional, Union
+import numpy as np
+
+from src.CEM import check_class_indices, encode_labels, get_cached_proximity_matrix
+
+
+def compute_class_indices(
+    scores: np.ndarray, thresholds: np.ndarray, orders: List[int]
+) -> np.ndarray:
+    """Cut continuous scores into ordinal classes: a score is assigned the
+    class whose rank by order is the number of thresholds not above it.
+
+    Args:
+        scores (np.ndarray): continuous scores
+        thresholds (np.ndarray): K - 1 cut-points
+        orders (List[int]): class orders
+
+    Returns:
+        np.ndarray: class indices into orders
+    """
+    ranks = np.searchsorted(np.sort(thresholds), scores, "right")
+    return np.argsort(orders, kind="stable")[ranks]
+
+
+class ThresholdSweep:
+    """Compute CEM of many candidate sets of cut-points over the same
+    continuous scores, e.g. for a grid search.
+
+    Scores are sorted once within each actual class. Any set of cut-points
+    then splits the scores of each actual class into K contiguous ranges,
+    whose sizes, found by binary search, make up its confusion matrix, in
+    O(K^2 log N) per set and O(N) memory. The proximity matrix of the actual
+    classes stays the same for all sets.
+
+    Args:
+        y_true (np.ndarray): actual labels
+        scores (np.ndarray): continuous scores, the higher the higher the order
+        orders (List[int]): class orders
+        class_names (List, optional): class names, aligned with orders. If not
+            given, labels are class indices into orders.
+    Attributes:
+        orders: List of class orders
+        actual_counts: count of each actual class
+        proximity_matrix: proximity between classes of the actual distribution
+
+    """
+
+    def __init__(
+        self,
+        y_true: np.ndarray,
+        scores: np.ndarray,
+        orders: List[int],
+        class_names: Optional[List] = None,
+    ) -> None:
+        self.orders = list(orders)
+        numb_classes = len(self.orders)
+        actual_indices = encode_labels(y_true, class_names).ravel()
+        check_class_indices(actual_indices, numb_classes)
+        scores = np.asarray(scores).ravel()
+        if scores.shape != actual_indices.shape:
+            raise ValueError("Actual labels and scores must have the same shape.")
+
+        # scores of actual class a span class_offsets[a] to class_offsets[a + 1]
+        self._sorted_scores = scores[np.lexsort((scores, actual_indices))]
+        self.actual_counts = np.bincount(actual_indices, minlength=numb_classes)
+        self._class_offsets = np.concatenate(([0], np.cumsum(self.actual_counts)))
+        self.proximity_matrix = get_cached_proximity_matrix(self.orders, self.actual_counts)
+
+        # row r holds the proximity of the class of rank r to each actual class
+        rank_indices = np.argsort(self.orders, kind="stable")
+        self._rank_vs_actual = self.proximity_matrix[rank_indices]
+        observed = self.actual_counts > 0
+        self._sum_denominator = np.dot(
+            self.actual_counts[observed], np.diagonal(self.proximity_matrix)[observed]
+        )
+
+    def compute_cem(self, thresholds: np.ndarray) -> Union[float, np.ndarray]:
+        """Compute CEM of sets of cut-points.
+
+        Args:
+            thresholds (np.ndarray): K - 1 cut-points, or M x (K - 1) for M
+                sets of cut-points
+
+        Returns:
+            Union[float, np.ndarray]: CEM, one per set if several
+        """
+        thresholds = np.sort(np.asarray(thresholds, dtype=np.float64), axis=-1)
+        numb_classes = len(self.orders)
+        if thresholds.shape[-1:] != (numb_classes - 1,):
+            raise ValueError(
+                f"Expect {numb_classes - 1} thresholds per set, got {thresholds.shape[-1:]}."
+            )
+        threshold_sets = thresholds.reshape(-1, numb_classes - 1)
+
+        # one row of the confusion matrix of every set at a time, predictions
+        # of rank r lying between boundaries[:, r] and boundaries[:, r + 1]
+        sum_numerator = np.zeros(len(threshold_sets))
+        boundaries = np.zeros((len(threshold_sets), numb_classes + 1), dtype=np.int64)
+        for actual_index in np.flatnonzero(self.actual_counts):
+            class_scores = self._sorted_scores[
+                self._class_offsets[actual_index] : self._class_offsets[actual_index + 1]
+            ]
+            boundaries[:, 1:-1] = np.searchsorted(class_scores, threshold_sets, "left")
+            boundaries[:, -1] = len(class_scores)
+            rank_counts = np.diff(boundaries, axis=1)
+            sum_numerator += rank_counts @ self._rank_vs_actual[:, actual_index]
+
+        proximity = sum_numerator.reshape(thresholds.shape[:-1]) / self._sum_denominator
+        if np.ndim(proximity) == 0:
+            return float(proximity)
+        return proximity
+
+    def sweep(
+        self, thresholds: np.ndarray, threshold_index: int, candidates: np.ndarray
+    ) -> np.ndarray:
+        """Compute the CEM curve of one cut-point moving over candidate values,
+        the others staying fixed.
+
+        Args:
+            thresholds (np.ndarray): K - 1 cut-points
+            threshold_index (int): index of the moving cut-point
+            candidates (np.ndarray): values of the moving cut-point
+
+        Returns:
+            np.ndarray: CEM for each candidate
+        """
+        candidates = np.asarray(candidates, dtype=np.float64).ravel()
+        threshold_sets = np.tile(np.asarray(thresholds, dtype=np.float64), (len(candidates), 1))
+        threshold_sets[:, threshold_index] = candidates
+        return self.compute_cem(threshold_sets)
@@ -1,3 +1,4 @@
+from typing import List, Tuple
 import numpy as np
 
 def compute_accuracy_score(confusion_matrix: np.array) -> float:
@@ -5,4 +6,54 @@ def compute_accuracy_score(confusion_matrix: np.array) -> float:
     total_samples = np.sum(confusion_matrix)
     accuracy = np.sum(true_positives) / total_samples
 
-    return accuracy
\ No newline at end of file
+    return accuracy
+
+
+def get_top_n_class_pairs(
+    proximity_matrix: np.ndarray,
+    class_names: List[str],
+    n: int,
+    descending: bool = True,
+    exclude_diagonal: bool = True,
+) -> List[Tuple[str, str, float]]:
+    """Get the n class pairs of highest (or lowest) proximity, by partial
+    selection over the proximity matrix instead of a full sort.
+
+    Ties are broken in row-major order of the matrix.
+
+    Args:
+        proximity_matrix (np.ndarray): K x K proximity matrix
+        class_names (List[str]): class names, aligned with the matrix axes
+        n (int): number of pairs
+        descending (bool): whether to select the highest proximities
+        exclude_diagonal (bool): whether to skip pairs of a class with itself
+
+    Returns:
+        List[Tuple[str, str, float]]: (first class, second class, proximity)
+    """
+    proximity_matrix = np.asarray(proximity_matrix, dtype=np.float64)
+    numb_classes = proximity_matrix.shape[0]
+    sort_keys = -proximity_matrix if descending else proximity_matrix.copy()
+    sort_keys = sort_keys.ravel()
+    candidates = np.arange(sort_keys.size)
+    if exclude_diagonal:
+        candidates = candidates[candidates % (numb_classes + 1) != 0]
+
+    n = min(n, candidates.size)
+    if n <= 0:
+        return []
+    if n < candidates.size:
+        # keep every tie of the n-th key, so that ties are broken by position
+        nth_key = np.partition(sort_keys[candidates], n - 1)[n - 1]
+        candidates = candidates[sort_keys[candidates] <= nth_key]
+    top_indices = candidates[np.lexsort((candidates, sort_keys[candidates]))[:n]]
+
+    first_indices, second_indices = np.divmod(top_indices, numb_classes)
+    return [
+        (
+            class_names[first_index],
+            class_names[second_index],
+            proximity_matrix[first_index, second_index].item(),
+        )
+        for first_index, second_index in zip(first_indices, second_indices)
+    ]
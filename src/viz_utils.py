@@ -1,13 +1,17 @@
 from enum import Enum
-from typing import Dict
-import pandas as pd
-from matplotlib import pyplot as plt
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Optional
 import numpy as np
 
 
 from src.CEM import ClosenessInformationQuantityCompute
 from src.ordinal_class_dist import OrdinalClassDistribution
 
+# pandas and matplotlib are imported on first use, so that importing this
+# module stays as cheap as importing numpy
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class RGBColor(Enum):
     RED = (1, 0, 0)
@@ -40,47 +44,120 @@ THREE_COLOR_LIST = [
 ]
 
 
-def scatter_plot_from_single_class_distribution(class_dist_df: pd.DataFrame):
-    data = list()
+@lru_cache(maxsize=None)
+def get_class_colors(numb_classes: int) -> np.ndarray:
+    """Get the RGB color of each class position, from the lowest to the
+    highest order. 3- and 5-class scales keep their own colors, others sample
+    a red-yellow-green colormap.
+
+    Args:
+        numb_classes (int): number of classes
+
+    Returns:
+        np.ndarray: read-only numb_classes x 3 colors
+    """
+    if numb_classes == 3:
+        class_colors = np.asarray(THREE_COLOR_LIST, dtype=np.float64)
+    elif numb_classes == 5:
+        class_colors = np.asarray(FIVE_COLOR_LIST, dtype=np.float64)
+    else:
+        from matplotlib import pyplot as plt
+
+        colormap = plt.get_cmap("RdYlGn")
+        class_colors = colormap(np.linspace(0, 1, numb_classes))[:, :3]
+    class_colors.setflags(write=False)
+    return class_colors
+
+
+def downsample_counts(counts: np.ndarray, max_points: int) -> np.ndarray:
+    """Scale counts down proportionally so that they sum to max_points, by
+    largest remainder.
+
+    Args:
+        counts (np.ndarray): counts
+        max_points (int): maximum sum of the scaled counts
+
+    Returns:
+        np.ndarray: scaled counts, unchanged if they sum to at most max_points
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total_count = counts.sum()
+    if total_count <= max_points:
+        return counts
+
+    quotas = counts * (max_points / total_count)
+    scaled_counts = np.floor(quotas).astype(np.int64)
+    numb_remaining_points = max_points - scaled_counts.sum()
+    largest_remainders = np.argsort(scaled_counts - quotas, kind="stable")
+    scaled_counts[largest_remainders[:numb_remaining_points]] += 1
+    return scaled_counts
+
+
+def draw_points(
+    ax,
+    x: np.ndarray,
+    y: np.ndarray,
+    colors: np.ndarray,
+    weights: np.ndarray,
+    is_downsampled: bool,
+    use_density: bool,
+) -> None:
+    if is_downsampled and use_density:
+        # each point stands for weight samples of its class
+        ax.hexbin(x, y, C=weights, reduce_C_function=np.sum, cmap="Greys", mincnt=1)
+        return
+
+    ax.scatter(x, y, c=colors, alpha=0.8, edgecolor="black", s=70)
+
+
+def scatter_plot_from_single_class_distribution(
+    class_dist_df: "pd.DataFrame",
+    max_points: Optional[int] = None,
+    use_density: bool = False,
+):
+    """Scatter one point per sample above its class.
+
+    Args:
+        class_dist_df (pd.DataFrame): class_name, order and count columns
+        max_points (int, optional): beyond this number of samples, the classes
+            are subsampled proportionally. Count labels remain exact.
+        use_density (bool): draw subsampled points as a hexbin density
+            instead of a scatter
 
-    # generate records based on count in confusion matrix
-    for _, row in class_dist_df.iterrows():
-        class_name, order, count = row.tolist()
-        data.extend([[class_name, order]] * count)
+    Returns:
+        matplotlib.figure.Figure: the plot
+    """
+    class_orders = class_dist_df["order"].to_numpy()
+    counts = class_dist_df["count"].to_numpy().astype(np.int64)
+    plotted_counts = counts if max_points is None else downsample_counts(counts, max_points)
 
-    scatter_data = pd.DataFrame(data=data, columns=["class_name", "order"])
-    numb_points = scatter_data.shape[0]
+    class_colors = get_class_colors(len(class_dist_df["class_name"]))
+
+    numb_points = plotted_counts.sum()
     noise_x = np.random.uniform(-0.3, 0.3, size=numb_points)
     noise_y = np.random.uniform(-0.8, 0.8, size=numb_points)
+    x = np.repeat(class_orders, plotted_counts) + noise_x
+    y = 1 + noise_y
+    colors = np.repeat(class_colors, plotted_counts, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.repeat(counts / plotted_counts, plotted_counts)
 
-    class_x_mapping = dict(zip(class_dist_df["class_name"], class_dist_df["order"]))
-    scatter_data["x"] = (
-        scatter_data["class_name"].apply(lambda x: class_x_mapping[x]) + noise_x
-    )
-    scatter_data["y"] = 1 + noise_y
-
-    numb_classes = len(class_dist_df["class_name"])
-    if numb_classes == 3:
-        class_color_mapping = dict(zip(class_dist_df["class_name"], THREE_COLOR_LIST))
-    elif numb_classes == 5:
-        class_color_mapping = dict(zip(class_dist_df["class_name"], FIVE_COLOR_LIST))
-    scatter_data["color"] = scatter_data["class_name"].apply(
-        lambda x: class_color_mapping[x]
-    )
+    from matplotlib import pyplot as plt
 
     fig, ax = plt.subplots()
-    ax.set_xlim(0, 6)
+    ax.set_xlim(class_orders.min() - 1, class_orders.max() + 1)
     ax.set_ylim(0, 2.5)
     ax.set_xticks(class_dist_df["order"])
     ax.set_xticklabels(class_dist_df["class_name"], rotation=30)
     ax.set_yticks([])
-    ax.scatter(
-        scatter_data["x"],
-        scatter_data["y"],
-        c=scatter_data["color"],
-        alpha=0.8,
-        edgecolor="black",
-        s=70,
+    draw_points(
+        ax,
+        x,
+        y,
+        colors,
+        weights,
+        is_downsampled=numb_points < counts.sum(),
+        use_density=use_density,
     )
 
     # assign total count per class
@@ -90,37 +167,52 @@ def scatter_plot_from_single_class_distribution(class_dist_df: pd.DataFrame):
     return fig
 
 
-def scatter_plot_from_confusion_matrix(confusion_matrix_df: pd.DataFrame):
+def scatter_plot_from_confusion_matrix(
+    confusion_matrix_df: "pd.DataFrame",
+    max_points: Optional[int] = None,
+    use_density: bool = False,
+):
+    """Scatter one point per sample above its actual class, colored by its
+    predicted class.
+
+    Args:
+        confusion_matrix_df (pd.DataFrame): confusion matrix, whose first
+            column holds the actual class names
+        max_points (int, optional): beyond this number of samples, the cells
+            are subsampled proportionally
+        use_density (bool): draw subsampled points as a hexbin density
+            instead of a scatter
+
+    Returns:
+        matplotlib.figure.Figure: the plot
+    """
     class_names = confusion_matrix_df.columns.tolist()[1:]
-    confusion_matrix_query_df = confusion_matrix_df.set_index("actual\predict")
-    count_data = list()
-    for actual_class in class_names:
-        for predict_class in class_names:
-            count = confusion_matrix_query_df.loc[actual_class][predict_class]
-            count_data.append([actual_class, predict_class, count])
-
-    scatter_data = list()
+    confusion_matrix_query_df = confusion_matrix_df.set_index("actual\\predict")
+    counts = (
+        confusion_matrix_query_df.loc[class_names, class_names]
+        .to_numpy()
+        .astype(np.int64)
+        .ravel()
+    )
+    plotted_counts = counts if max_points is None else downsample_counts(counts, max_points)
+
     numb_classes = len(class_names)
-    class_orders = list(range(1, numb_classes + 1))
-    actual_class_x_mapping = dict(zip(class_names, class_orders))
-    if numb_classes == 3:
-        predict_class_color_mapping = dict(zip(class_names, THREE_COLOR_LIST))
-    elif numb_classes == 5:
-        predict_class_color_mapping = dict(zip(class_names, FIVE_COLOR_LIST))
-    for actual_class, predict_class, count in count_data:
-        if count == 0:
-            continue
+    class_orders = np.arange(1, numb_classes + 1)
+    class_colors = get_class_colors(numb_classes)
 
-        x_val = actual_class_x_mapping[actual_class]
-        color = predict_class_color_mapping[predict_class]
-        scatter_data.extend([[x_val, color]] * count)
+    # cells are flattened as [actual, predict]
+    x = np.repeat(np.repeat(class_orders, numb_classes), plotted_counts)
+    colors = np.repeat(np.tile(class_colors, (numb_classes, 1)), plotted_counts, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.repeat(counts / plotted_counts, plotted_counts)
 
-    scatter_data = pd.DataFrame(scatter_data, columns=["x", "color"])
-    numb_points = scatter_data.shape[0]
+    numb_points = plotted_counts.sum()
     noise_x = np.random.uniform(-0.15, 0.15, size=numb_points)
     noise_y = np.random.uniform(-0.8, 0.8, size=numb_points)
-    scatter_data["x"] += noise_x
-    scatter_data["y"] = 1 + noise_y
+    x = x + noise_x
+    y = 1 + noise_y
+
+    from matplotlib import pyplot as plt
 
     fig, ax = plt.subplots()
     ax.set_xlim(0, numb_classes + 1)
@@ -128,34 +220,49 @@ def scatter_plot_from_confusion_matrix(confusion_matrix_df: pd.DataFrame):
     ax.set_xticks(class_orders)
     ax.set_xticklabels(class_names, rotation=30)
     ax.set_yticks([])
-    ax.scatter(
-        scatter_data["x"],
-        scatter_data["y"],
-        c=scatter_data["color"],
-        alpha=0.8,
-        edgecolor="black",
-        s=70,
+    draw_points(
+        ax,
+        x,
+        y,
+        colors,
+        weights,
+        is_downsampled=numb_points < counts.sum(),
+        use_density=use_density,
     )
 
     return fig
 
 
-def get_class_proximity_dict_from_confusion_matrix(confusion_matrix_df: pd.DataFrame):
+def get_proximity_matrix_from_class_distribution(
+    class_dist_df: "pd.DataFrame",
+) -> np.ndarray:
+    """Get the proximity between every pair of classes of a distribution.
+
+    Args:
+        class_dist_df (pd.DataFrame): class_name, order and count columns
+
+    Returns:
+        np.ndarray: proximity matrix, both axes in the order of class_name
+    """
     dist = OrdinalClassDistribution(
-        confusion_matrix_df["class_name"],
-        confusion_matrix_df["order"],
-        confusion_matrix_df["count"],
+        class_dist_df["class_name"],
+        class_dist_df["order"],
+        class_dist_df["count"],
     )
     CIQ_compute = ClosenessInformationQuantityCompute(dist)
+    return CIQ_compute.get_proximity_matrix()
+
+
+def get_class_proximity_dict_from_confusion_matrix(confusion_matrix_df: "pd.DataFrame"):
+    proximity_matrix = get_proximity_matrix_from_class_distribution(confusion_matrix_df)
 
     class_proximity_dict = dict()
-    for first_class_name in confusion_matrix_df["class_name"]:
-        for second_class_name in confusion_matrix_df["class_name"]:
+    class_names = confusion_matrix_df["class_name"].tolist()
+    for first_index, first_class_name in enumerate(class_names):
+        for second_index, second_class_name in enumerate(class_names):
             if first_class_name == second_class_name:
                 continue
-            proximity = CIQ_compute.get_proximity_between_two_classes(
-                first_class_name, second_class_name
-            )
+            proximity = proximity_matrix[first_index, second_index].item()
             class_proximity_dict[f"{first_class_name}-{second_class_name}"] = proximity
 
     return class_proximity_dict
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from src.CEM import compute_cem_from_confusion_counts, compute_cem_from_sparse_counts
+
+# classes 1 and 2 share an order
+ORDERS = [0, 1, 1, 3, 4]
+
+
+def test_sparse_counts_match_dense_with_duplicates_and_explicit_zeros():
+    actual_indices = np.array([0, 1, 2, 2, 3, 3, 4, 0, 4])
+    predict_indices = np.array([0, 2, 1, 1, 4, 3, 4, 1, 0])
+    sample_counts = np.array([5, 3, 2, 4, 7, 0, 6, 1, 0])
+    # duplicate entries are summed, as in scipy COO matrices
+    dense_counts = np.zeros((5, 5), dtype=np.int64)
+    np.add.at(dense_counts, (actual_indices, predict_indices), sample_counts)
+    expected = compute_cem_from_confusion_counts(dense_counts, ORDERS)
+
+    triplets = (actual_indices, predict_indices, sample_counts)
+    assert math.isclose(compute_cem_from_sparse_counts(triplets, ORDERS), expected)
+    coo_counts = sparse.coo_matrix(
+        (sample_counts, (actual_indices, predict_indices)), shape=(5, 5)
+    )
+    assert math.isclose(compute_cem_from_sparse_counts(coo_counts, ORDERS), expected)
+    assert math.isclose(
+        compute_cem_from_sparse_counts(coo_counts.tocsr(), ORDERS), expected
+    )
+
+
+def test_sparse_counts_match_dense_on_random_counts():
+    rng = np.random.default_rng(0)
+    dense_counts = rng.integers(0, 5, size=(5, 5)) * (rng.random((5, 5)) < 0.4)
+    dense_counts[np.arange(5), np.arange(5)] += 1
+
+    assert math.isclose(
+        compute_cem_from_sparse_counts(sparse.csr_matrix(dense_counts), ORDERS),
+        compute_cem_from_confusion_counts(dense_counts, ORDERS),
+    )
+
+
+@pytest.mark.parametrize(
+    "actual_indices, predict_indices",
+    [([0, 5], [0, 1]), ([0, 1], [-1, 1]), ([0, 7], [0, 1])],
+)
+def test_sparse_counts_reject_out_of_range_indices(actual_indices, predict_indices):
+    triplets = (np.array(actual_indices), np.array(predict_indices), np.array([1, 0]))
+    with pytest.raises(ValueError):
+        compute_cem_from_sparse_counts(triplets, ORDERS)
@@ -0,0 +1,123 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+from src.CEM import compute_cem_from_confusion_counts
+from src.io_utils import (
+    CONFUSION_MATRIX_SUFFIXES,
+    load_class_distribution,
+    load_confusion_matrix,
+    save_class_distribution,
+    save_confusion_matrix,
+)
+from src.ordinal_class_dist import OrdinalClassDistribution
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+CLASS_NAMES = ["low", "mid", "high", "top"]
+ORDERS = [1, 2, 3, 4]
+CONFUSION_COUNTS = np.array([[5, 2, 0, 1], [1, 7, 3, 0], [0, 2, 9, 1], [0, 0, 4, 6]])
+
+
+@pytest.mark.parametrize("suffix", CONFUSION_MATRIX_SUFFIXES)
+def test_confusion_matrix_round_trip(tmp_path, suffix):
+    path = str(tmp_path / f"confusion{suffix}")
+    save_confusion_matrix(path, CONFUSION_COUNTS, CLASS_NAMES, ORDERS)
+    confusion_counts, class_names, orders = load_confusion_matrix(path)
+
+    np.testing.assert_array_equal(confusion_counts, CONFUSION_COUNTS)
+    assert class_names == CLASS_NAMES
+    assert orders == ORDERS
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow", ".npz", ".npy"])
+def test_confusion_matrix_round_trip_keeps_unsorted_and_shared_orders(tmp_path, suffix):
+    orders = [3, 1, 3, 2]
+    path = str(tmp_path / f"confusion{suffix}")
+    save_confusion_matrix(path, CONFUSION_COUNTS, CLASS_NAMES, orders)
+    confusion_counts, class_names, loaded_orders = load_confusion_matrix(path)
+
+    np.testing.assert_array_equal(confusion_counts, CONFUSION_COUNTS)
+    assert class_names == CLASS_NAMES
+    assert loaded_orders == orders
+
+
+def test_csv_lists_classes_sorted_by_order(tmp_path):
+    orders = [30, 10, 40, 20]
+    path = str(tmp_path / "confusion.csv")
+    save_confusion_matrix(path, CONFUSION_COUNTS, CLASS_NAMES, orders)
+    confusion_counts, class_names, loaded_orders = load_confusion_matrix(path)
+
+    sorted_indices = np.argsort(orders)
+    assert class_names == [CLASS_NAMES[index] for index in sorted_indices]
+    np.testing.assert_array_equal(
+        confusion_counts, CONFUSION_COUNTS[np.ix_(sorted_indices, sorted_indices)]
+    )
+    # only the ranks of the orders are kept, which CEM does not tell apart
+    assert loaded_orders == [1, 2, 3, 4]
+    assert math.isclose(
+        compute_cem_from_confusion_counts(confusion_counts, loaded_orders),
+        compute_cem_from_confusion_counts(CONFUSION_COUNTS, orders),
+    )
+
+
+def test_csv_rejects_shared_orders(tmp_path):
+    with pytest.raises(ValueError):
+        save_confusion_matrix(
+            str(tmp_path / "confusion.csv"), CONFUSION_COUNTS, CLASS_NAMES, [1, 2, 2, 3]
+        )
+
+
+def test_load_csv_with_bom_header_from_data():
+    path = os.path.join(DATA_DIR, "confusion-matrix-example.csv")
+    with open(path, "rb") as csv_file:
+        assert csv_file.read(3) == b"\xef\xbb\xbf"
+    confusion_counts, class_names, orders = load_confusion_matrix(path)
+
+    assert class_names == ["reject", "weak reject", "undecided", "weak accept", "accept"]
+    assert orders == [1, 2, 3, 4, 5]
+    assert confusion_counts[0].tolist() == [15, 1, 0, 0, 2]
+
+
+def test_load_csv_round_trip_of_data_file(tmp_path):
+    path = os.path.join(DATA_DIR, "confusion-matrix-example.csv")
+    confusion_counts, class_names, orders = load_confusion_matrix(path)
+    saved_path = str(tmp_path / "confusion.csv")
+    save_confusion_matrix(saved_path, confusion_counts, class_names, orders)
+
+    saved_counts, saved_class_names, saved_orders = load_confusion_matrix(saved_path)
+    np.testing.assert_array_equal(saved_counts, confusion_counts)
+    assert saved_class_names == class_names
+    assert saved_orders == orders
+
+
+def test_unsupported_suffix(tmp_path):
+    with pytest.raises(ValueError):
+        save_confusion_matrix(
+            str(tmp_path / "confusion.txt"), CONFUSION_COUNTS, CLASS_NAMES, ORDERS
+        )
+    with pytest.raises(ValueError):
+        load_confusion_matrix(str(tmp_path / "confusion.txt"))
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".arrow", ".feather", ".ipc", ".npz"])
+def test_class_distribution_round_trip(tmp_path, suffix):
+    ordinal_dist = OrdinalClassDistribution(CLASS_NAMES, [3, 1, 3, 2], [4, 8, 15, 16])
+    path = str(tmp_path / f"class_dist{suffix}")
+    save_class_distribution(path, ordinal_dist)
+    loaded_dist = load_class_distribution(path)
+
+    assert list(loaded_dist.class_names) == CLASS_NAMES
+    assert list(loaded_dist.class_orders) == [3, 1, 3, 2]
+    assert list(loaded_dist.counts) == [4, 8, 15, 16]
+    assert loaded_dist.get_sample_count_between_two_classes("mid", "low") == 16
+
+
+def test_load_class_distribution_with_bom_header(tmp_path):
+    path = tmp_path / "class_dist.csv"
+    path.write_bytes("class_name,order,count\nlow,1,3\nhigh,2,5\n".encode("utf-8-sig"))
+    ordinal_dist = load_class_distribution(str(path))
+
+    assert list(ordinal_dist.class_names) == ["low", "high"]
+    assert list(ordinal_dist.counts) == [3, 5]
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+from src.CEM import (
+    ClosenessInformationQuantityCompute,
+    compute_cem_from_confusion_counts,
+)
+from src.ordinal_class_dist import OrdinalClassDistribution
+
+# b and c share order 2, d and e share order 3
+CLASS_NAMES = ["a", "b", "c", "d", "e"]
+ORDERS = [1, 2, 2, 3, 3]
+COUNTS = [1, 2, 4, 8, 16]
+
+
+def test_classes_of_shared_order_are_all_in_between():
+    ordinal_dist = OrdinalClassDistribution(CLASS_NAMES, ORDERS, COUNTS)
+
+    assert ordinal_dist.get_class_names_in_between("a", "d") == ["b", "c"]
+    assert ordinal_dist.get_class_names_in_between("a", "b") == []
+    # counted once each, the baseline counted c twice and skipped b
+    assert ordinal_dist.get_sample_count_between_two_classes("a", "d") == 2 + 4
+    assert ordinal_dist.get_sample_count_between_two_classes("e", "a") == 2 + 4
+    assert ordinal_dist.get_sample_count_between_two_classes("b", "c") == 0
+    assert ordinal_dist.get_sample_count_between_two_classes("d", "e") == 0
+
+
+def test_proximity_with_shared_orders():
+    ordinal_dist = OrdinalClassDistribution(CLASS_NAMES, ORDERS, COUNTS)
+    CIQ_compute = ClosenessInformationQuantityCompute(ordinal_dist)
+    total_count = sum(COUNTS)
+
+    proximity = CIQ_compute.get_proximity_between_two_classes("a", "e")
+    assert math.isclose(proximity, -math.log2((1 / 2 + 2 + 4 + 16) / total_count))
+    proximity = CIQ_compute.get_proximity_between_two_classes("b", "c")
+    assert math.isclose(proximity, -math.log2((2 / 2 + 4) / total_count))
+
+
+def test_proximity_matrix_matches_per_pair_api_with_shared_orders():
+    ordinal_dist = OrdinalClassDistribution(CLASS_NAMES, ORDERS, COUNTS)
+    CIQ_compute = ClosenessInformationQuantityCompute(ordinal_dist)
+
+    proximity_matrix = CIQ_compute.get_proximity_matrix()
+    for first_index, first_class in enumerate(CLASS_NAMES):
+        for second_index, second_class in enumerate(CLASS_NAMES):
+            assert math.isclose(
+                proximity_matrix[first_index, second_index],
+                CIQ_compute.get_proximity_between_two_classes(first_class, second_class),
+            )
+
+
+def test_cem_matches_per_pair_api_with_shared_orders():
+    confusion_counts = np.random.default_rng(0).integers(1, 20, size=(5, 5))
+    ordinal_dist = OrdinalClassDistribution(
+        CLASS_NAMES, ORDERS, confusion_counts.sum(axis=1).tolist()
+    )
+    CIQ_compute = ClosenessInformationQuantityCompute(ordinal_dist)
+
+    sum_numerator, sum_denominator = 0.0, 0.0
+    for actual_index, actual_class in enumerate(CLASS_NAMES):
+        for predict_index, predict_class in enumerate(CLASS_NAMES):
+            sum_numerator += confusion_counts[
+                actual_index, predict_index
+            ] * CIQ_compute.get_proximity_between_two_classes(predict_class, actual_class)
+        sum_denominator += confusion_counts[
+            actual_index
+        ].sum() * CIQ_compute.get_proximity_between_two_classes(actual_class, actual_class)
+
+    assert math.isclose(
+        compute_cem_from_confusion_counts(confusion_counts, ORDERS),
+        sum_numerator / sum_denominator,
+    )
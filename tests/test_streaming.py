@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.CEM import compute_cem_from_confusion_counts, compute_confusion_counts
+from src.streaming import ClosenessEvaluationMeasureMonitor
+
+ORDERS = [0, 1, 1, 2, 4]
+NUMB_CLASSES = len(ORDERS)
+
+
+def make_events(numb_events, seed=0):
+    rng = np.random.default_rng(seed)
+    y_true = rng.integers(0, NUMB_CLASSES, size=numb_events)
+    y_pred = np.clip(y_true + rng.integers(-1, 2, size=numb_events), 0, NUMB_CLASSES - 1)
+    return y_true, y_pred
+
+
+def assert_matches_window(monitor, y_true, y_pred):
+    expected_counts = compute_confusion_counts(y_true, y_pred, numb_classes=NUMB_CLASSES)
+    np.testing.assert_array_equal(monitor.confusion_counts, expected_counts)
+    np.testing.assert_array_equal(monitor.actual_counts, expected_counts.sum(axis=1))
+    assert monitor.get_total_count() == len(y_true)
+    assert math.isclose(
+        monitor.get_proximity_between_two_dists(),
+        compute_cem_from_confusion_counts(expected_counts, ORDERS),
+    )
+
+
+def test_window_add_evicts_the_oldest_events():
+    y_true, y_pred = make_events(100)
+    monitor = ClosenessEvaluationMeasureMonitor(ORDERS, window_size=30)
+    for index, (actual, predict) in enumerate(zip(y_true, y_pred)):
+        monitor.add(actual, predict)
+        start = max(index + 1 - 30, 0)
+        assert_matches_window(monitor, y_true[start : index + 1], y_pred[start : index + 1])
+
+
+@pytest.mark.parametrize("batch_sizes", [[10, 25, 7], [45], [5, 80, 3], [29, 1, 30, 31]])
+def test_window_update_with_batches_larger_than_the_window(batch_sizes):
+    y_true, y_pred = make_events(sum(batch_sizes))
+    monitor = ClosenessEvaluationMeasureMonitor(ORDERS, window_size=30)
+    end = 0
+    for batch_size in batch_sizes:
+        monitor.update(y_true[end : end + batch_size], y_pred[end : end + batch_size])
+        end += batch_size
+        start = max(end - 30, 0)
+        assert_matches_window(monitor, y_true[start:end], y_pred[start:end])
+
+    # single events keep evicting in the right order after batches
+    monitor.add(y_true[0], y_pred[0])
+    assert_matches_window(
+        monitor,
+        np.append(y_true[end - 29 : end], y_true[0]),
+        np.append(y_pred[end - 29 : end], y_pred[0]),
+    )
+
+
+def test_empty_batch_leaves_the_monitor_unchanged():
+    y_true, y_pred = make_events(20)
+    for monitor in (
+        ClosenessEvaluationMeasureMonitor(ORDERS, window_size=10),
+        ClosenessEvaluationMeasureMonitor(ORDERS, half_life=5.0),
+    ):
+        monitor.update(y_true, y_pred)
+        confusion_counts = monitor.confusion_counts.copy()
+        proximity = monitor.get_proximity_between_two_dists()
+
+        assert monitor.update(np.array([], dtype=int), np.array([], dtype=int)) is monitor
+        np.testing.assert_array_equal(monitor.confusion_counts, confusion_counts)
+        assert monitor.get_proximity_between_two_dists() == proximity
+
+
+def compute_weighted_cem(y_true, y_pred, times, half_life):
+    # weights relative to the latest event, the scale of which cancels out in CEM
+    weights = 2.0 ** ((times - times.max()) / half_life)
+    weighted_counts = np.zeros((NUMB_CLASSES, NUMB_CLASSES))
+    np.add.at(weighted_counts, (y_true, y_pred), weights)
+    return compute_cem_from_confusion_counts(weighted_counts, ORDERS), weights.sum()
+
+
+def test_decay_matches_a_weighted_confusion_matrix():
+    y_true, y_pred = make_events(200)
+    times = np.arange(200, dtype=np.float64)
+    monitor = ClosenessEvaluationMeasureMonitor(ORDERS, half_life=20.0)
+    monitor.update(y_true[:50], y_pred[:50])
+    for actual, predict in zip(y_true[50:120], y_pred[50:120]):
+        monitor.add(actual, predict)
+    monitor.update(y_true[120:], y_pred[120:])
+
+    expected_proximity, expected_weight = compute_weighted_cem(y_true, y_pred, times, 20.0)
+    assert math.isclose(monitor.get_proximity_between_two_dists(), expected_proximity)
+    assert math.isclose(monitor.get_total_count(), expected_weight)
+
+
+def test_decay_rescales_past_the_max_exponent():
+    half_life = 1.0
+    max_exponent = ClosenessEvaluationMeasureMonitor.MAX_DECAY_EXPONENT
+    y_true, y_pred = make_events(60)
+    # events spread over more than 3 times the rescaling range
+    times = np.sort(np.random.default_rng(1).uniform(0, 3.5 * max_exponent, size=60))
+    times[-1] = times[-2] + 0.5
+    monitor = ClosenessEvaluationMeasureMonitor(ORDERS, half_life=half_life)
+    monitor.update(y_true[:20], y_pred[:20], timestamps=times[:20])
+    for actual, predict, time in zip(y_true[20:40], y_pred[20:40], times[20:40]):
+        monitor.add(actual, predict, timestamp=time)
+    monitor.update(y_true[40:], y_pred[40:], timestamps=times[40:])
+
+    assert np.all(np.isfinite(monitor.confusion_counts))
+    assert monitor.confusion_counts.max() <= 2.0**max_exponent
+    expected_proximity, expected_weight = compute_weighted_cem(
+        y_true, y_pred, times, half_life
+    )
+    assert math.isclose(monitor.get_proximity_between_two_dists(), expected_proximity)
+    assert math.isclose(monitor.get_total_count(), expected_weight)
@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.CEM import compute_cem_from_labels
+from src.threshold_sweep import ThresholdSweep, compute_class_indices
+
+# classes listed out of order: class 1 is the lowest, class 2 the highest
+ORDERS = [2, 0, 3, 1]
+
+
+def compute_expected_cem(y_true, scores, thresholds, orders):
+    return compute_cem_from_labels(
+        y_true, compute_class_indices(scores, thresholds, orders), orders
+    )
+
+
+def test_compute_class_indices_with_non_monotone_orders():
+    class_indices = compute_class_indices(
+        np.array([-1.0, 0.0, 0.5, 1.0, 1.5, 2.0, 9.0]), np.array([0.0, 1.0, 2.0]), ORDERS
+    )
+    # a score equal to a cut-point goes to the class above it
+    assert class_indices.tolist() == [1, 3, 3, 0, 0, 2, 2]
+
+
+def test_compute_cem_matches_labels_with_ties_at_cut_points():
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, 4, size=500)
+    # integer scores, so that many fall exactly on the cut-points
+    scores = rng.integers(0, 6, size=500).astype(np.float64)
+    threshold_sweep = ThresholdSweep(y_true, scores, ORDERS)
+
+    for thresholds in ([1.0, 2.0, 4.0], [0.0, 3.0, 5.0], [4.0, 1.0, 2.0], [2.0, 2.0, 2.0]):
+        assert math.isclose(
+            threshold_sweep.compute_cem(np.array(thresholds)),
+            compute_expected_cem(y_true, scores, np.array(thresholds), ORDERS),
+        )
+
+
+def test_compute_cem_of_several_sets_matches_one_by_one():
+    rng = np.random.default_rng(1)
+    y_true = rng.integers(0, 4, size=300)
+    scores = rng.normal(size=300) + np.asarray(ORDERS)[y_true]
+    threshold_sweep = ThresholdSweep(y_true, scores, ORDERS)
+    threshold_sets = np.sort(rng.normal(1.5, 1.0, size=(2, 5, 3)), axis=-1)
+
+    proximities = threshold_sweep.compute_cem(threshold_sets)
+    assert proximities.shape == (2, 5)
+    for index in np.ndindex(2, 5):
+        assert math.isclose(
+            proximities[index],
+            compute_expected_cem(y_true, scores, threshold_sets[index], ORDERS),
+        )
+
+
+def test_sweep_matches_labels_with_ties_at_cut_points():
+    rng = np.random.default_rng(2)
+    y_true = rng.integers(0, 4, size=400)
+    scores = rng.integers(0, 8, size=400) / 2
+    threshold_sweep = ThresholdSweep(y_true, scores, ORDERS)
+    thresholds = np.array([1.0, 2.0, 3.0])
+    candidates = np.arange(0, 9) / 2
+
+    curve = threshold_sweep.sweep(thresholds, 1, candidates)
+    for candidate, proximity in zip(candidates, curve):
+        moved_thresholds = thresholds.copy()
+        moved_thresholds[1] = candidate
+        assert math.isclose(
+            proximity, compute_expected_cem(y_true, scores, moved_thresholds, ORDERS)
+        )
+
+
+def test_class_names_and_missing_actual_classes():
+    class_names = ["mid", "low", "top", "high"]
+    y_true = np.array(["low", "mid", "mid", "top", "low", "mid"])
+    scores = np.array([0.1, 1.0, 1.2, 2.5, 1.0, 0.4])
+    threshold_sweep = ThresholdSweep(y_true, scores, ORDERS, class_names)
+    thresholds = np.array([0.5, 1.0, 2.0])
+
+    y_pred = np.asarray(class_names)[compute_class_indices(scores, thresholds, ORDERS)]
+    assert math.isclose(
+        threshold_sweep.compute_cem(thresholds),
+        compute_cem_from_labels(y_true, y_pred, ORDERS, class_names),
+    )
+
+
+def test_wrong_number_of_thresholds():
+    threshold_sweep = ThresholdSweep(np.array([0, 1]), np.array([0.0, 1.0]), ORDERS)
+    with pytest.raises(ValueError):
+        threshold_sweep.compute_cem(np.array([0.0, 1.0]))